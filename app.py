@@ -2,12 +2,29 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-from leitura_excel import carregar_dados
-from processamento import preparar_dados
-import io
+from datetime import datetime
+from leitura_excel import get_file_hash
+from armazenamento import (
+    diretorio_armazem, importar_arquivo, ler_armazem, ler_cubo, ler_manifesto, meses_armazem, periodo_armazem,
+)
+from registro import abrir_arrow, caminho_arrow, registro, salvar_arrow
+from processamento import LIMITES_FAIXAS, ROTULOS_FAIXAS, COLUNAS_TEMPO, MODELO_TEMPO, componentes_tempo
+from processamento import horas_para_tempo, horas_para_tempo_vetorizado, formatar_exibicao
+from consultas import MotorConsultas, agrupar_outros, filtros_vazios
+from exportacao import FORMATOS, chave_estado, gerar_exportacao, medicoes
+from instrumentacao import MAX_MEDIDAS_SESSAO, ativar_coleta, etapa, memoria_residente
+from collections import deque
+import functools
+import os
+import uuid
 import locale
 
+# Acima deste número de linhas a tabela detalhada é paginada no servidor (DuckDB)
+TABELA_MAX_LINHAS = int(os.environ.get("TABELA_MAX_LINHAS", 50_000))
+# Gráficos: acima destes limites as categorias viram Top N + "Outros" e a linha do tempo usa WebGL
+GRAFICO_MAX_CATEGORIAS = int(os.environ.get("GRAFICO_MAX_CATEGORIAS", 30))
+GRAFICO_LIMITE_WEBGL = int(os.environ.get("GRAFICO_LIMITE_WEBGL", 1000))
+
 # Tentar configurar o locale para Português Brasil
 try:
     locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
@@ -176,36 +193,528 @@ st.markdown("""
 # ==================== SIDEBAR - UPLOAD E FILTROS ====================
 with st.sidebar:
     st.markdown("### 📂 Upload de Dados")
-    arquivo = st.file_uploader(
-        "Selecione o arquivo Excel ou CSV",
+    arquivos = st.file_uploader(
+        "Selecione os arquivos Excel ou CSV",
         type=["xlsx", "csv"],
-        help="Faça upload do arquivo de horas trabalhadas (.xlsx ou .csv)"
+        accept_multiple_files=True,
+        help="Faça upload de um ou mais arquivos de horas trabalhadas (.xlsx ou .csv)"
+    )
+    incluir_historico = st.checkbox(
+        "📚 Incluir histórico já importado",
+        value=False,
+        help="Analisa também os arquivos importados anteriormente (armazém particionado por mês e Regional)"
     )
     
-    if arquivo:
-        st.success("✅ Arquivo carregado com sucesso!")
+    if arquivos:
+        st.success(f"✅ {len(arquivos)} arquivo(s) carregado(s) com sucesso!")
+
+# ==================== DIAGNÓSTICO DE DESEMPENHO ====================
+# As etapas medidas (instrumentacao.py) desta sessão ficam em session_state e aparecem no
+# painel opcional da sidebar; as mesmas medidas saem como linhas de log JSON.
+def diagnostico_sessao():
+    """Medidas das etapas desta sessão (as mais recentes no fim)"""
+    if "diagnostico" not in st.session_state:
+        st.session_state["diagnostico"] = deque(maxlen=MAX_MEDIDAS_SESSAO)
+        st.session_state["id_sessao"] = uuid.uuid4().hex[:8]
+    return st.session_state["diagnostico"]
+
+def secao_medida(nome):
+    """Seção do dashboard medida como uma etapa; reativa a coleta nas reexecuções do fragmento"""
+    def decorador(func):
+        @functools.wraps(func)
+        def executar(*args, **kwargs):
+            ativar_coleta(diagnostico_sessao(), st.session_state["id_sessao"])
+            with etapa(nome):
+                return func(*args, **kwargs)
+        return executar
+    return decorador
+
+def painel_diagnostico():
+    """Painel opcional na sidebar: últimas etapas medidas, resumo por etapa e memória do processo"""
+    with st.sidebar:
+        st.markdown("---")
+        if not st.toggle("🩺 Diagnóstico de desempenho", key="diagnostico_visivel"):
+            return
+        medidas = pd.DataFrame(list(diagnostico_sessao()))
+        if medidas.empty:
+            st.caption("Nenhuma etapa medida ainda.")
+            return
+        colunas = [c for c in ["etapa", "segundos", "cache", "linhas", "delta_mb", "formato", "erro"] if c in medidas.columns]
+        st.markdown("**Últimas etapas**")
+        st.dataframe(medidas[colunas].iloc[::-1].head(30), hide_index=True, use_container_width=True)
+        st.markdown("**Por etapa (sessão)**")
+        resumo = medidas.groupby("etapa")["segundos"].agg(vezes="count", media="mean", maximo="max")
+        st.dataframe(resumo.sort_values("maximo", ascending=False).round(4), use_container_width=True)
+        rss = memoria_residente()
+        estatisticas = registro.estatisticas()
+        st.caption((
+            (f"Memória do processo: {rss / 1024 ** 2:,.0f} MB · " if rss is not None else "")
+            + f"Registro: {estatisticas['entradas']} recorte(s), {estatisticas['bytes'] / 1024 ** 2:,.0f} "
+            f"de {estatisticas['max_bytes'] / 1024 ** 2:,.0f} MB · Sessão {st.session_state['id_sessao']}"
+        ).replace(",", "."))
+
+def parar():
+    """`st.stop()` com o painel de diagnóstico: recortes vazios e falhas são justamente o que se quer diagnosticar"""
+    painel_diagnostico()
+    st.stop()
+
+ativar_coleta(diagnostico_sessao(), st.session_state["id_sessao"])
 
 # ==================== FUNÇÕES COM CACHE ====================
-@st.cache_data(show_spinner=False)
-def carregar_e_processar_dados(arquivo_buffer):
-    """Função cacheada para leitura e processamento ultrarápido"""
-    with st.spinner('🚀 Otimizando e preparando dados...'):
-        df_raw = carregar_dados(arquivo_buffer)
-        df_proc = preparar_dados(df_raw)
-        return df_proc
+def chave_dataset(arquivo):
+    """
+    Digest do conteúdo do upload, calculado UMA vez por sessão e guardado por `file_id`
+    (estável enquanto o arquivo estiver no uploader). Evita que o Streamlit releia e
+    re-hashear o buffer inteiro a cada interação só para achar o cache.
+    """
+    digests = st.session_state.setdefault("digests_upload", {})
+    if arquivo.file_id not in digests:
+        digests[arquivo.file_id] = get_file_hash(arquivo)
+    return digests[arquivo.file_id]
+
+def importar_upload(arquivo, manifesto, progresso=None):
+    """
+    Importa o arquivo no armazém só se o digest ainda não estiver em `manifesto` (lido uma
+    vez por execução). Após uma importação, `manifesto` é atualizado no lugar com o do disco.
+    """
+    file_hash = chave_dataset(arquivo)
+    if file_hash not in manifesto["arquivos"]:
+        with st.spinner(f'🚀 Otimizando e preparando {arquivo.name}...'), etapa("importar_upload", cache="miss") as medida:
+            importar_arquivo(arquivo, progresso=progresso, file_hash=file_hash)
+            manifesto.update(ler_manifesto())
+            medida["linhas"] = manifesto["arquivos"][file_hash]["linhas"]
+    return file_hash
+
+def motor_periodo(data_inicio, data_fim, origens, sequencia_armazem):
+    """
+    Lê só as partições do período (linhas + cubo pré-agregado) e registra no motor DuckDB.
+    O motor vem do registro compartilhado do processo (registro.py): sessões com o mesmo
+    recorte usam a mesma cópia, e outro processo reabre o recorte via memory map do arquivo
+    Arrow em vez de remontá-lo. `sequencia_armazem` muda a chave a cada importação.
+    O recorte é identificado pelos MESES lidos (a leitura só poda por mês): mudar as datas
+    dentro dos mesmos meses reaproveita o motor, e as datas exatas ficam no predicado das consultas.
+    A sessão mantém uma referência ao recorte atual (liberada ao trocar de recorte ou ao
+    fim da sessão); recortes sem referência saem por LRU acima de REGISTRO_MAX_MB.
+    O `motor.df` é devolvido sem cópia e é somente leitura: a MRU já vem normalizada do
+    carregamento (`categorizar` + `limpar_mru`).
+    """
+    origens = None if origens is None else sorted(origens)
+    meses = meses_armazem(data_inicio, data_fim, origens=None if origens is None else set(origens))
+    if not meses:
+        anterior = st.session_state.pop("referencia_dataset", None)
+        if anterior is not None:
+            anterior.liberar()
+        return None
+    chave = chave_estado(diretorio_armazem(), meses, origens, sequencia_armazem)
+    # Período dos meses inteiros: o mesmo conteúdo para qualquer data dentro deles
+    inicio_meses = pd.Period(meses[0], freq="M").start_time
+    fim_meses = pd.Period(meses[-1], freq="M").end_time.normalize()
+
+    with etapa("recorte_periodo", cache="registro", meses=len(meses)) as medida:
+        def construir():
+            df = abrir_arrow(caminho_arrow(chave))
+            medida["cache"] = "arrow"
+            if df is None:
+                medida["cache"] = "miss"
+                df = ler_armazem(inicio_meses, fim_meses, origens=None if origens is None else set(origens))
+                if df is None:
+                    return None
+                salvar_arrow(df, caminho_arrow(chave))
+            cubo = ler_cubo(inicio_meses, fim_meses, origens=None if origens is None else set(origens), dados=df)
+            return MotorConsultas(df, cubo=cubo)
+
+        motor, referencia = registro.adquirir(chave, construir)
+        medida["linhas"] = 0 if motor is None else len(motor.df)
+    anterior = st.session_state.get("referencia_dataset")
+    if anterior is not None and anterior.chave == chave:
+        referencia.liberar()  # a sessão já segura este recorte
+    else:
+        st.session_state["referencia_dataset"] = referencia
+        if anterior is not None:
+            anterior.liberar()
+    return motor
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def exportacao_cacheada(formato, chave_filtros, _motor, _filtros):
+    """
+    Gera o arquivo de exportação só quando o download é pedido, em streaming.
+    O cache é indexado pelo hash do estado dos filtros (`chave_filtros`), então baixar
+    de novo a mesma visão não refaz o arquivo. `_motor`/`_filtros` ficam fora do hash.
+    """
+    return gerar_exportacao(formato, _motor.linhas(_filtros), chave=chave_filtros)
+
+# ==================== SEÇÕES DO DASHBOARD (FRAGMENTOS) ====================
+# Cada aba, a tabela detalhada e as exportações são fragmentos: uma interação dentro de uma
+# seção reexecuta só aquela seção. As abas usam `on_change="rerun"` e só a aba aberta é
+# calculada e desenhada; as agregações vêm da memória do motor (por estado dos filtros).
+@st.fragment
+@secao_medida("secao_visao_geral")
+def secao_visao_geral(agregados):
+    """Aba Visão Geral: distribuição das MRUs por faixa, gauge de eficiência e Top 10 MRUs"""
+    # --- DISTRIBUIÇÃO DE CONCLUSÃO ---
+    st.markdown("#### ⏱️ Distribuição de Conclusão por MRU")
+
+    mru_medias = agregados["mru"][["MRU", "Horas_Liquidas"]]
+    mru_medias['Faixa'] = pd.cut(mru_medias['Horas_Liquidas'], bins=LIMITES_FAIXAS, labels=ROTULOS_FAIXAS)
+
+    faixas_counts = mru_medias['Faixa'].value_counts().reindex(ROTULOS_FAIXAS).reset_index()
+    faixas_counts.columns = ['Faixa', 'Quantidade']
+    faixas_counts['Percentual'] = (faixas_counts['Quantidade'] / faixas_counts['Quantidade'].sum() * 100).fillna(0)
+
+    # Não filtrar Quantidade > 0 para que todas as faixas (incluindo 12h+) apareçam no gráfico
+    if not faixas_counts.empty:
+        fig_faixas = px.bar(
+            faixas_counts,
+            y='Faixa',
+            x='Quantidade',
+            orientation='h',
+            text=faixas_counts.apply(lambda x: f"{int(x['Quantidade'])} ({x['Percentual']:.1f}%)", axis=1),
+            color='Quantidade',
+            color_continuous_scale='Sunsetdark',
+            labels={'Quantidade': 'Total de MRUs', 'Faixa': 'Faixa de Horas'}
+        )
+    
+        fig_faixas.update_traces(
+            textposition='inside',
+            hovertemplate="<b>Faixa:</b> %{y}<br><b>Quantidade:</b> %{x}<extra></extra>"
+        )
+        fig_faixas.update_layout(height=400, showlegend=False, coloraxis_showscale=False, margin=dict(l=20, r=20, t=10, b=20))
+        st.plotly_chart(fig_faixas, use_container_width=True)
+    else:
+        st.info("ℹ️ Não há dados suficientes para mostrar a distribuição de faixas horárias.")
+
+    # Centralizar o gauge removendo o histograma
+    col_esp1, col_center, col_esp2 = st.columns([1, 2, 1])
+
+    with col_center:
+        percentual_acima_8 = (mru_medias["Horas_Liquidas"] >= 8).mean() * 100
+        fig_gauge = go.Figure(go.Indicator(
+            mode="gauge+number",
+            value=percentual_acima_8,
+            title={'text': "Eficiência: MRUs ≥ 08:00:00", 'font': {'size': 20, 'color': '#2c3e50'}},
+            gauge={
+                'bar': {'color': "#ff4b2b"},
+                'axis': {'range': [0, 100], 'ticksuffix': '%'},
+                'steps': [
+                    {'range': [0, 80], 'color': "#f8f9fa"},
+                    {'range': [80, 100], 'color': "#d1fae5"}
+                ]
+            }
+        ))
+        fig_gauge.update_layout(height=350, margin=dict(l=30, r=30, t=50, b=20))
+        st.plotly_chart(fig_gauge, use_container_width=True)
+
+    # --- TOP 10 MRUS - REVISADO (A-Z E > 8H) ---
+    st.markdown("#### 🏆 Top 10 MRUs Acima da Meta (Ordem Alfabética)")
+    mru_top_data = mru_medias[mru_medias['Horas_Liquidas'] > 8].copy()
+
+    if not mru_top_data.empty:
+        mru_top_data = mru_top_data.sort_values("MRU", ascending=True).head(10)
+        mru_top_data['Tempo_HHMMSS'] = horas_para_tempo_vetorizado(mru_top_data['Horas_Liquidas'])
+    
+        # Garantir que MRU seja tratada como string/categoria para evitar problemas de escala numérica
+        mru_top_data['MRU_Label'] = mru_top_data['MRU'].astype(str)
+    
+        fig_top_mru = px.bar(
+            mru_top_data,
+            x="MRU_Label",
+            y="Horas_Liquidas",
+            text="Tempo_HHMMSS",
+            color="Horas_Liquidas",
+            color_continuous_scale="Sunsetdark",
+            labels={"Horas_Liquidas": "Horas Líquidas", "MRU_Label": "MRU"}
+        )
+    
+        fig_top_mru.update_traces(
+            textposition='outside',
+            cliponaxis=False,
+            hovertemplate="<b>MRU:</b> %{x}<br><b>Horas Trabalhadas:</b> %{text}<extra></extra>"
+        )
+    
+        # Forçar o eixo X como categoria para as barras ficarem juntas e organizadas
+        max_y = mru_top_data['Horas_Liquidas'].max() * 1.2
+        fig_top_mru.update_layout(
+            height=450, 
+            coloraxis_showscale=False, 
+            xaxis_title="MRU", 
+            yaxis_title="Horas Líquidas",
+            xaxis_type='category',
+            yaxis=dict(range=[0, max_y]),
+            margin=dict(t=50)
+        )
+        st.plotly_chart(fig_top_mru, use_container_width=True)
+    else:
+        st.warning("Nenhuma MRU acima de 08:00:00 encontrada para os filtros atuais.")
+
+@st.fragment
+@secao_medida("secao_colaboradores")
+def secao_colaboradores(agregados):
+    """Aba Por Colaborador: médias (barras) e totais (pizza)"""
+    # POR COLABORADOR (HH:MM:SS)
+    # Muitos colaboradores: Top N por média + "Outros" (hover/texto via customdata numérico)
+    colab_medias = agrupar_outros(
+        agregados["colaborador"].sort_values("Horas_Liquidas", ascending=False), "Colaborador", GRAFICO_MAX_CATEGORIAS
+    )
+    sufixo_top = f" (Top {GRAFICO_MAX_CATEGORIAS} + Outros)" if len(agregados["colaborador"]) > GRAFICO_MAX_CATEGORIAS else ""
+
+    fig_colab = px.bar(
+        colab_medias,
+        x="Colaborador", y="Horas_Liquidas",
+        title="Média de Horas por Colaborador" + sufixo_top,
+        labels={"Horas_Liquidas": "Média de Horas Líquidas", "Colaborador": "Colaborador"},
+        color="Horas_Liquidas", 
+        color_continuous_scale="Viridis" # Cor vibrante
+    )
+    fig_colab.update_traces(
+        customdata=componentes_tempo(colab_medias['Horas_Liquidas']),
+        texttemplate=MODELO_TEMPO,
+        textposition='outside',
+        cliponaxis=False,
+        hovertemplate="<b>Colaborador:</b> %{x}<br><b>Horas Trabalhadas:</b> " + MODELO_TEMPO + "<extra></extra>"
+    )
+    fig_colab.add_hline(y=8, line_dash="dash", line_color="black", annotation_text="Meta 08:00:00")
+    max_y_colab = max(8.5, colab_medias['Horas_Liquidas'].max() * 1.3) # Ajuste para o texto não sobrepor a meta
+    fig_colab.update_layout(
+        height=450, 
+        coloraxis_showscale=False,
+        yaxis=dict(range=[0, max_y_colab]),
+        margin=dict(t=60)
+    )
+    st.plotly_chart(fig_colab, use_container_width=True)
+
+    # Total de horas por colaborador (Pie Chart) - AUMENTADO
+    colab_totais = agrupar_outros(
+        agregados["colaborador"].sort_values("Soma", ascending=False), "Colaborador", GRAFICO_MAX_CATEGORIAS, por="Soma"
+    ).reset_index(drop=True)
+
+    fig_total_colab = px.pie(
+        colab_totais,
+        values="Soma",
+        names="Colaborador",
+        title="Distribuição Total de Horas por Colaborador" + sufixo_top,
+        color_discrete_sequence=px.colors.sequential.Sunsetdark
+    )
+    fig_total_colab.update_traces(
+        textposition='inside', 
+        textinfo='percent+label',
+        customdata=componentes_tempo(colab_totais['Soma']),
+        hovertemplate="<b>Colaborador:</b> %{label}<br><b>Horas Trabalhadas:</b> " + MODELO_TEMPO + "<extra></extra>"
+    )
+    fig_total_colab.update_layout(height=650, margin=dict(l=50, r=50, t=100, b=50))
+    st.plotly_chart(fig_total_colab, use_container_width=True)
+
+@st.fragment
+@secao_medida("secao_rotas")
+def secao_rotas(agregados):
+    """Aba Por Rota/Regional"""
+    # POR ROTA E REGIONAL (HH:MM:SS)
+    c1, c2 = st.columns(2)
+
+    with c1:
+        rota_medias = agrupar_outros(agregados["rota"], "Rota", GRAFICO_MAX_CATEGORIAS)
+        fig_rota = px.bar(
+            rota_medias, x="Rota", y="Horas_Liquidas", 
+            title="Média de Horas por Rota" + (f" (Top {GRAFICO_MAX_CATEGORIAS} + Outros)" if len(agregados["rota"]) > GRAFICO_MAX_CATEGORIAS else ""),
+            labels={"Horas_Liquidas": "Média Horas", "Rota": "Rota"},
+            color="Horas_Liquidas", 
+            color_continuous_scale="Sunsetdark"
+        )
+        fig_rota.update_traces(
+            customdata=componentes_tempo(rota_medias['Horas_Liquidas']),
+            texttemplate=MODELO_TEMPO,
+            textposition='outside',
+            cliponaxis=False,
+            hovertemplate="<b>Rota:</b> %{x}<br><b>Horas Trabalhadas:</b> " + MODELO_TEMPO + "<extra></extra>"
+        )
+        max_y_rota = rota_medias['Horas_Liquidas'].max() * 1.2
+        fig_rota.update_layout(
+            height=450, showlegend=False, 
+            coloraxis_showscale=False, xaxis_tickangle=-45,
+            yaxis=dict(range=[0, max_y_rota]),
+            margin=dict(t=50)
+        )
+        st.plotly_chart(fig_rota, use_container_width=True)
+    
+    with c2:
+        reg_medias = agrupar_outros(agregados["regional"], "Regional", GRAFICO_MAX_CATEGORIAS)
+        fig_reg = px.bar(
+            reg_medias, x="Regional", y="Horas_Liquidas", 
+            title="Média de Horas por Regional" + (f" (Top {GRAFICO_MAX_CATEGORIAS} + Outros)" if len(agregados["regional"]) > GRAFICO_MAX_CATEGORIAS else ""),
+            labels={"Horas_Liquidas": "Média Horas", "Regional": "Regional"},
+            color="Horas_Liquidas", 
+            color_continuous_scale="Sunsetdark"
+        )
+        fig_reg.update_traces(
+            customdata=componentes_tempo(reg_medias['Horas_Liquidas']),
+            texttemplate=MODELO_TEMPO,
+            textposition='outside',
+            cliponaxis=False,
+            hovertemplate="<b>Regional:</b> %{x}<br><b>Horas Trabalhadas:</b> " + MODELO_TEMPO + "<extra></extra>"
+        )
+        max_y_reg = reg_medias['Horas_Liquidas'].max() * 1.2
+        fig_reg.update_layout(
+            height=450, showlegend=False, 
+            coloraxis_showscale=False, xaxis_tickangle=-45,
+            yaxis=dict(range=[0, max_y_reg]),
+            margin=dict(t=50)
+        )
+        st.plotly_chart(fig_reg, use_container_width=True)
+
+@st.fragment
+@secao_medida("secao_evolucao")
+def secao_evolucao(agregados):
+    """Aba Evolução Temporal: linha diária e heatmap dia da semana x semana"""
+    # EVOLUÇÃO TEMPORAL (HH:MM:SS)
+    tempo_evolucao = agregados["data"][["Data", "Horas_Liquidas"]]
+    # Muitas datas: traço WebGL (Scattergl) e sem marcadores
+    muitos_pontos = len(tempo_evolucao) > GRAFICO_LIMITE_WEBGL
+
+    fig_evolucao = px.line(
+        tempo_evolucao, x="Data", y="Horas_Liquidas", 
+        title="Evolução da Média de Horas Líquidas ao Longo do Tempo",
+        labels={"Horas_Liquidas": "Média Horas", "Data": "Data"},
+        markers=not muitos_pontos,
+        render_mode="webgl" if muitos_pontos else "svg"
+    )
+    fig_evolucao.add_hline(y=8, line_dash="dash", line_color="red", annotation_text="Meta 08:00:00")
+    fig_evolucao.update_traces(
+        line_color='#ff4b2b', line_width=3 if not muitos_pontos else 1.5, 
+        mode="lines" if muitos_pontos else "lines+markers", 
+        hovertemplate="<b>Data:</b> %{x}<br><b>Horas Trabalhadas:</b> " + MODELO_TEMPO + "<extra></extra>", 
+        customdata=componentes_tempo(tempo_evolucao['Horas_Liquidas'])
+    )
+    fig_evolucao.update_layout(
+        height=450,
+        xaxis=dict(
+            tickformat="%d/%m/%Y",  # Formato brasileiro numérico para evitar inglês
+            title="Data"
+        )
+    )
+    st.plotly_chart(fig_evolucao, use_container_width=True)
+
+    # Heatmap (Tradução e Formatação HH:MM:SS)
+    heatmap_counts = agregados["heatmap"].pivot(index="DiaSemana", columns="Semana", values="Horas_Liquidas").fillna(0)
+    dias_ordem = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    dias_pt = {
+        'Monday': 'Segunda', 'Tuesday': 'Terça', 'Wednesday': 'Quarta', 
+        'Thursday': 'Quinta', 'Friday': 'Sexta', 'Saturday': 'Sábado', 'Sunday': 'Domingo'
+    }
+    heatmap_counts = heatmap_counts.reindex(dias_ordem).rename(index=dias_pt)
+
+    # Matriz (dia x semana x [sinal, h, m, s]) para o hover, formatada pelo Plotly
+    hover_tempo = componentes_tempo(heatmap_counts.to_numpy())
+
+    fig_heatmap = px.imshow(
+        heatmap_counts,
+        labels=dict(x="", y="", color="Média Horas"),
+        x=heatmap_counts.columns,
+        y=heatmap_counts.index,
+        aspect="auto",
+        color_continuous_scale="Sunsetdark",
+        title="Frequência de Trabalho por Dia e Semana"
+    )
+
+    fig_heatmap.update_traces(
+        hovertemplate="<b>Dia da Semana:</b> %{y}<br><b>Média Horas:</b> " + MODELO_TEMPO + "<extra></extra>",
+        customdata=hover_tempo
+    )
+
+    fig_heatmap.update_layout(
+        xaxis=dict(showticklabels=False), # Remover Semana do Ano do eixo
+        coloraxis_showscale=False
+    )
+    st.plotly_chart(fig_heatmap, use_container_width=True)
+
+@st.fragment
+@secao_medida("secao_tabela")
+def secao_tabela(motor, filtros):
+    """Tabela detalhada: completa até TABELA_MAX_LINHAS, paginada no DuckDB acima disso"""
+
+    total_linhas = motor.contar_linhas(filtros)
+    if total_linhas <= TABELA_MAX_LINHAS:
+        # Formatação HH:MM:SS feita aqui, só para as linhas exibidas
+        df_exibicao = formatar_exibicao(motor.linhas(filtros))
+        st.dataframe(df_exibicao, use_container_width=True, hide_index=True)
+    else:
+        # Recorte grande: busca, ordenação e paginação no DuckDB; só a página visível é formatada
+        colunas_ordenacao = {"Data": "Data", "Colaborador": "Colaborador", "Rota": "Rota", "Regional": "Regional", "MRU": "MRU"}
+        colunas_ordenacao.update({rotulo: coluna for coluna, rotulo in COLUNAS_TEMPO.items()})
+    
+        col_tab1, col_tab2, col_tab3, col_tab4 = st.columns([3, 2, 1, 1])
+        with col_tab1:
+            busca = st.text_input("🔎 Buscar (Colaborador, Rota, Regional ou MRU)", key="tabela_busca")
+        with col_tab2:
+            ordenar_por = st.selectbox("Ordenar por", list(colunas_ordenacao), key="tabela_ordem")
+        with col_tab3:
+            decrescente = st.selectbox("Ordem", ["Crescente", "Decrescente"], key="tabela_direcao") == "Decrescente"
+        with col_tab4:
+            tamanho_pagina = st.selectbox("Linhas por página", [50, 100, 250, 500], index=1, key="tabela_tamanho")
+    
+        busca = busca.strip() or None
+        total_busca = motor.contar_linhas(filtros, busca)
+        n_paginas = max(1, -(-total_busca // tamanho_pagina))
+        # Página só pela session_state (sem `value=`, que conflitaria com a atribuição abaixo)
+        if st.session_state.get("tabela_pagina", n_paginas + 1) > n_paginas:
+            st.session_state["tabela_pagina"] = 1  # primeira exibição, ou busca/filtros encolheram o recorte
+        numero_pagina = st.number_input(f"Página (de {n_paginas})", min_value=1, max_value=n_paginas, step=1, key="tabela_pagina")
+    
+        pagina = motor.pagina(
+            filtros, ordenar_por=colunas_ordenacao[ordenar_por], decrescente=decrescente,
+            busca=busca, numero=int(numero_pagina) - 1, tamanho=tamanho_pagina,
+        )
+        st.dataframe(formatar_exibicao(pagina), use_container_width=True, hide_index=True)
+        inicio = (int(numero_pagina) - 1) * tamanho_pagina
+        st.caption(
+            f"Linhas {inicio + 1:,}–{inicio + len(pagina):,} de {total_busca:,} "
+            f"(recorte com {total_linhas:,} linhas; tabela paginada acima de {TABELA_MAX_LINHAS:,})".replace(",", ".")
+        )
+
+@st.fragment
+@secao_medida("secao_exportacao")
+def secao_exportacao(motor, filtros, chave_filtros):
+    """Botões de download: arquivos gerados só no clique (callable), em streaming e cacheados pelo estado dos filtros"""
+    carimbo = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # Excel divide em várias planilhas acima de 1.048.575 linhas; CSV gzip e Parquet para outras ferramentas
+    for coluna, formato in zip(st.columns(len(FORMATOS)), FORMATOS):
+        with coluna:
+            st.download_button(
+                label=f"📥 Baixar {FORMATOS[formato]['rotulo']}",
+                data=lambda formato=formato: exportacao_cacheada(formato, chave_filtros, motor, filtros),
+                file_name=f"horas_trabalhadas_{carimbo}.{FORMATOS[formato]['extensao']}",
+                mime=FORMATOS[formato]["mime"],
+                use_container_width=True
+            )
+            # Tempo e tamanho aparecem depois que o formato foi gerado para esta visão
+            medicao = medicoes.get((formato, chave_filtros))
+            if medicao:
+                st.caption(f"⏱️ {medicao['segundos']:.2f} s · {medicao['bytes'] / 1024 ** 2:.2f} MB".replace(".", ","))
 
 # ==================== PROCESSAMENTO DE DADOS ====================
-if arquivo:
+if arquivos:
     try:
-        # Carregar e processar dados com cache de alta performance
-        df = carregar_e_processar_dados(arquivo)
+        # Importar cada arquivo no armazém (incremental, com cache de alta performance)
+        barra_progresso = st.empty()
+        def atualizar_progresso(linhas_lidas, total_estimado):
+            barra_progresso.progress(
+                min(linhas_lidas / total_estimado, 1.0),
+                text=f"📥 Lendo planilha: {linhas_lidas:,} de ~{total_estimado:,} linhas".replace(",", ".")
+            )
+        manifesto = ler_manifesto()
+        origens = tuple(
+            importar_upload(arquivo, manifesto, progresso=atualizar_progresso)
+            for arquivo in sorted(arquivos, key=lambda a: a.name)
+        )
+        barra_progresso.empty()
         
-        # Garantir limpeza da MRU (Camada extra de segurança caso o cache seja antigo)
-        if "MRU" in df.columns:
-            df["MRU"] = df["MRU"].astype(str).str.split('-').str[0].str.strip().str.zfill(8)
+        origens_consulta = None if incluir_historico else origens
+        periodo_min, periodo_max = periodo_armazem(origens_consulta, manifesto=manifesto)
+        if periodo_min is None:
+            st.error("❌ Nenhuma data válida encontrada nos arquivos enviados.")
+            parar()
     except Exception as e:
         st.error(f"❌ Erro ao processar o arquivo: {e}")
-        st.stop()
+        parar()
     
     # ==================== FILTROS NA SIDEBAR ====================
     with st.sidebar:
@@ -216,8 +725,8 @@ if arquivo:
         st.markdown("#### 📅 Período")
         col_data1, col_data2 = st.columns(2)
         
-        data_min = df["Data"].min().date()
-        data_max = df["Data"].max().date()
+        data_min = periodo_min.date()
+        data_max = periodo_max.date()
         
         with col_data1:
             data_inicio = st.date_input(
@@ -234,10 +743,18 @@ if arquivo:
                 min_value=data_min,
                 max_value=data_max
             )
-        
+    
+    # Ler apenas as partições (meses) que se sobrepõem ao período selecionado
+    sequencia_armazem = manifesto["sequencia"]
+    motor = motor_periodo(data_inicio, data_fim, origens_consulta, sequencia_armazem)
+    if motor is None:
+        st.warning("⚠️ Nenhum dado encontrado para o período selecionado.")
+        parar()
+    
+    with st.sidebar:
         # Filtro de Rota (Movido para cima para filtrar colaborador)
         st.markdown("#### 🗺️ Rota")
-        rotas = ["Todas"] + sorted(df["Rota"].dropna().unique().tolist())
+        rotas = ["Todas"] + motor.indice.opcoes("Rota")
         rota_selecionada = st.multiselect(
             "Selecione as rotas",
             rotas,
@@ -247,7 +764,7 @@ if arquivo:
         
         # Filtro de Regional
         st.markdown("#### 🏢 Regional")
-        regionais = ["Todas"] + sorted(df["Regional"].dropna().unique().tolist())
+        regionais = ["Todas"] + motor.indice.opcoes("Regional")
         regional_selecionada = st.multiselect(
             "Selecione as regionais",
             regionais,
@@ -257,13 +774,9 @@ if arquivo:
 
         # Filtro de Colaborador (Dinâmico)
         st.markdown("#### 👤 Colaborador")
-        # Filtrar lista de colaboradores baseada na rota se não for "Todas"
-        if "Todas" not in rota_selecionada:
-            df_lista_colab = df[df["Rota"].isin(rota_selecionada)]
-        else:
-            df_lista_colab = df
-            
-        colaboradores = ["Todos"] + sorted(df_lista_colab["Colaborador"].dropna().unique().tolist())
+        # Lista de colaboradores em cascata pela rota (pares rota/colaborador pré-calculados)
+        rotas_cascata = None if "Todas" in rota_selecionada else rota_selecionada
+        colaboradores = ["Todos"] + motor.indice.opcoes("Colaborador", rotas=rotas_cascata)
         colaborador_selecionado = st.selectbox(
             "Selecione o colaborador",
             colaboradores,
@@ -272,11 +785,7 @@ if arquivo:
         
         # Filtro de MRU
         st.markdown("#### 📍 MRU")
-        if "Todas" not in rota_selecionada:
-            df_lista_mru = df[df["Rota"].isin(rota_selecionada)]
-        else:
-            df_lista_mru = df
-        mrus = ["Todas"] + sorted(df_lista_mru["MRU"].dropna().unique().tolist())
+        mrus = ["Todas"] + motor.indice.opcoes("MRU", rotas=rotas_cascata)
         mru_selecionada = st.multiselect(
             "Selecione as MRUs",
             mrus,
@@ -287,8 +796,7 @@ if arquivo:
         # Filtro de Perfil de Produtividade
         st.markdown("---")
         st.markdown("#### 🎯 Perfil de Produtividade")
-        bins = [0, 8, 9, 10, 11, 12, 100]
-        labels_faixas = ['Até 08:00:00', 'Até 09:00:00', 'Até 10:00:00', 'Até 11:00:00', 'Até 12:00:00', 'Acima de 12:00:00']
+        labels_faixas = ROTULOS_FAIXAS
         
         perfis_disponiveis = ["Todos"] + labels_faixas
         perfil_selecionado = st.selectbox("Filtrar por Faixa de Horas:", perfis_disponiveis)
@@ -299,387 +807,74 @@ if arquivo:
             st.rerun()
     
     # ==================== APLICAR FILTROS ====================
-    # Criar máscara inicial (True para todos os registros)
-    mask = (df["Data"].dt.date >= data_inicio) & (df["Data"].dt.date <= data_fim)
+    filtros = filtros_vazios(data_inicio, data_fim)
     
-    # Aplicar filtros sequencialmente
     if colaborador_selecionado != "Todos":
-        mask &= (df["Colaborador"] == colaborador_selecionado)
+        filtros["colaborador"] = colaborador_selecionado
     
     if "Todas" not in rota_selecionada:
-        mask &= (df["Rota"].isin(rota_selecionada))
+        filtros["rotas"] = rota_selecionada
         
     if "Todas" not in regional_selecionada:
-        mask &= (df["Regional"].isin(regional_selecionada))
+        filtros["regionais"] = regional_selecionada
         
     if "Todas" not in mru_selecionada:
-        mask &= (df["MRU"].isin(mru_selecionada))
+        filtros["mrus"] = mru_selecionada
     
-    # Criar o DataFrame filtrado
-    df_filtrado = df[mask].copy()
-    
-    # Aplicar o filtro de Perfil se não for "Todos"
+    # Perfil de produtividade: código da faixa (pertinência pré-calculada no cubo e no índice)
     if perfil_selecionado != "Todos":
-        df_filtrado['_temp_perfil'] = pd.cut(df_filtrado['Horas_Liquidas'], bins=bins, labels=labels_faixas)
-        df_filtrado = df_filtrado[df_filtrado['_temp_perfil'] == perfil_selecionado]
+        filtros["faixa"] = labels_faixas.index(perfil_selecionado)
+    
+    # Todas as agregações do dashboard em uma única consulta DuckDB
+    agregados = motor.agregados(filtros)
 
     # ==================== MÉTRICAS PRINCIPAIS ====================
     st.markdown("---")
     st.markdown('<div class="section-header">📊 Métricas Gerais</div>', unsafe_allow_html=True)
     
     col1, col2, col3, col4 = st.columns(4)
-    from processamento import horas_para_tempo
     
     with col1:
-        media_colaborador = df_filtrado.groupby('Colaborador')['Horas_Liquidas'].mean().mean()
+        media_colaborador = agregados['colaborador']['Horas_Liquidas'].mean()
         st.metric(label="👤 Média por Colaborador", value=horas_para_tempo(media_colaborador))
     
     with col2:
-        media_rota = df_filtrado.groupby('Rota')['Horas_Liquidas'].mean().mean()
+        media_rota = agregados['rota']['Horas_Liquidas'].mean()
         st.metric(label="🗺️ Média por Rota", value=horas_para_tempo(media_rota))
     
     with col3:
-        media_regional = df_filtrado.groupby('Regional')['Horas_Liquidas'].mean().mean()
+        media_regional = agregados['regional']['Horas_Liquidas'].mean()
         st.metric(label="🏢 Média por Regional", value=horas_para_tempo(media_regional))
     
     with col4:
-        media_mru = df_filtrado.groupby('MRU')['Horas_Liquidas'].mean().mean()
+        media_mru = agregados['mru']['Horas_Liquidas'].mean()
         st.metric(label="📍 Média por MRU", value=horas_para_tempo(media_mru))
     
     # ==================== GRÁFICOS PROFISSIONAIS ====================
     st.markdown("---")
     st.markdown('<div class="section-header">📈 Análises Visuais</div>', unsafe_allow_html=True)
     
-    if df_filtrado.empty:
+    if agregados["total"]["Registros"] == 0:
         st.warning("⚠️ Nenhum dado encontrado para os filtros selecionados. Tente ajustar o período ou os seletores na barra lateral.")
-        st.stop()
-
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Visão Geral", "👥 Por Colaborador", "🗺️ Por Rota/Regional", "📅 Evolução Temporal"])
-    
-    with tab1:
-        # --- DISTRIBUIÇÃO DE CONCLUSÃO ---
-        st.markdown("#### ⏱️ Distribuição de Conclusão por MRU")
-        
-        mru_medias = df_filtrado.groupby(["MRU", "MRU_Completa"])["Horas_Liquidas"].mean().reset_index()
-        mru_medias['Faixa'] = pd.cut(mru_medias['Horas_Liquidas'], bins=bins, labels=labels_faixas)
-        
-        faixas_counts = mru_medias['Faixa'].value_counts().reindex(labels_faixas).reset_index()
-        faixas_counts.columns = ['Faixa', 'Quantidade']
-        faixas_counts['Percentual'] = (faixas_counts['Quantidade'] / faixas_counts['Quantidade'].sum() * 100).fillna(0)
-        
-        # Não filtrar Quantidade > 0 para que todas as faixas (incluindo 12h+) apareçam no gráfico
-        if not faixas_counts.empty:
-            fig_faixas = px.bar(
-                faixas_counts,
-                y='Faixa',
-                x='Quantidade',
-                orientation='h',
-                text=faixas_counts.apply(lambda x: f"{int(x['Quantidade'])} ({x['Percentual']:.1f}%)", axis=1),
-                color='Quantidade',
-                color_continuous_scale='Sunsetdark',
-                labels={'Quantidade': 'Total de MRUs', 'Faixa': 'Faixa de Horas'}
-            )
-            
-            fig_faixas.update_traces(
-                textposition='inside',
-                hovertemplate="<b>Faixa:</b> %{y}<br><b>Quantidade:</b> %{x}<extra></extra>"
-            )
-            fig_faixas.update_layout(height=400, showlegend=False, coloraxis_showscale=False, margin=dict(l=20, r=20, t=10, b=20))
-            st.plotly_chart(fig_faixas, use_container_width=True)
-        else:
-            st.info("ℹ️ Não há dados suficientes para mostrar a distribuição de faixas horárias.")
-        
-        # Centralizar o gauge removendo o histograma
-        col_esp1, col_center, col_esp2 = st.columns([1, 2, 1])
-        
-        with col_center:
-            percentual_acima_8 = (mru_medias["Horas_Liquidas"] >= 8).mean() * 100
-            fig_gauge = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=percentual_acima_8,
-                title={'text': "Eficiência: MRUs ≥ 08:00:00", 'font': {'size': 20, 'color': '#2c3e50'}},
-                gauge={
-                    'bar': {'color': "#ff4b2b"},
-                    'axis': {'range': [0, 100], 'ticksuffix': '%'},
-                    'steps': [
-                        {'range': [0, 80], 'color': "#f8f9fa"},
-                        {'range': [80, 100], 'color': "#d1fae5"}
-                    ]
-                }
-            ))
-            fig_gauge.update_layout(height=350, margin=dict(l=30, r=30, t=50, b=20))
-            st.plotly_chart(fig_gauge, use_container_width=True)
-
-        # --- TOP 10 MRUS - REVISADO (A-Z E > 8H) ---
-        st.markdown("#### 🏆 Top 10 MRUs Acima da Meta (Ordem Alfabética)")
-        mru_top_data = mru_medias[mru_medias['Horas_Liquidas'] > 8].copy()
-        
-        if not mru_top_data.empty:
-            mru_top_data = mru_top_data.sort_values("MRU_Completa", ascending=True).head(10)
-            mru_top_data['Tempo_HHMMSS'] = mru_top_data['Horas_Liquidas'].apply(horas_para_tempo)
-            
-            # Garantir que MRU seja tratada como string/categoria para evitar problemas de escala numérica
-            mru_top_data['MRU_Label'] = mru_top_data['MRU'].astype(str)
-            
-            fig_top_mru = px.bar(
-                mru_top_data,
-                x="MRU_Label",
-                y="Horas_Liquidas",
-                text="Tempo_HHMMSS",
-                color="Horas_Liquidas",
-                color_continuous_scale="Sunsetdark",
-                labels={"Horas_Liquidas": "Horas Líquidas", "MRU_Label": "MRU"}
-            )
-            
-            fig_top_mru.update_traces(
-                textposition='outside',
-                cliponaxis=False,
-                hovertemplate="<b>MRU:</b> %{x}<br><b>Horas Trabalhadas:</b> %{text}<extra></extra>"
-            )
-            
-            # Forçar o eixo X como categoria para as barras ficarem juntas e organizadas
-            max_y = mru_top_data['Horas_Liquidas'].max() * 1.2
-            fig_top_mru.update_layout(
-                height=450, 
-                coloraxis_showscale=False, 
-                xaxis_title="MRU", 
-                yaxis_title="Horas Líquidas",
-                xaxis_type='category',
-                yaxis=dict(range=[0, max_y]),
-                margin=dict(t=50)
-            )
-            st.plotly_chart(fig_top_mru, use_container_width=True)
-        else:
-            st.warning("Nenhuma MRU acima de 08:00:00 encontrada para os filtros atuais.")
-    
-    with tab2:
-        # POR COLABORADOR (HH:MM:SS)
-        colab_medias = df_filtrado.groupby("Colaborador")["Horas_Liquidas"].mean().reset_index()
-        colab_medias['Tempo_Formatado'] = colab_medias['Horas_Liquidas'].apply(horas_para_tempo)
-        
-        fig_colab = px.bar(
-            colab_medias.sort_values("Horas_Liquidas", ascending=False),
-            x="Colaborador", y="Horas_Liquidas",
-            text="Tempo_Formatado",
-            title="Média de Horas por Colaborador",
-            labels={"Horas_Liquidas": "Média de Horas Líquidas", "Colaborador": "Colaborador"},
-            color="Horas_Liquidas", 
-            color_continuous_scale="Viridis" # Cor vibrante
-        )
-        fig_colab.update_traces(
-            textposition='outside',
-            cliponaxis=False,
-            hovertemplate="<b>Colaborador:</b> %{x}<br><b>Horas Trabalhadas:</b> %{text}<extra></extra>"
-        )
-        fig_colab.add_hline(y=8, line_dash="dash", line_color="black", annotation_text="Meta 08:00:00")
-        max_y_colab = max(8.5, colab_medias['Horas_Liquidas'].max() * 1.3) # Ajuste para o texto não sobrepor a meta
-        fig_colab.update_layout(
-            height=450, 
-            coloraxis_showscale=False,
-            yaxis=dict(range=[0, max_y_colab]),
-            margin=dict(t=60)
-        )
-        st.plotly_chart(fig_colab, use_container_width=True)
-        
-        # Total de horas por colaborador (Pie Chart) - AUMENTADO
-        colab_totais = df_filtrado.groupby("Colaborador")["Horas_Liquidas"].sum().sort_values(ascending=False).reset_index()
-        colab_totais['Tempo_Total'] = colab_totais['Horas_Liquidas'].apply(horas_para_tempo)
-        
-        fig_total_colab = px.pie(
-            colab_totais,
-            values="Horas_Liquidas",
-            names="Colaborador",
-            custom_data=['Tempo_Total'],
-            title="Distribuição Total de Horas por Colaborador",
-            color_discrete_sequence=px.colors.sequential.Sunsetdark
-        )
-        fig_total_colab.update_traces(
-            textposition='inside', 
-            textinfo='percent+label',
-            hovertemplate="<b>Colaborador:</b> %{label}<br><b>Horas Trabalhadas:</b> %{customdata[0]}<extra></extra>"
-        )
-        fig_total_colab.update_layout(height=650, margin=dict(l=50, r=50, t=100, b=50))
-        st.plotly_chart(fig_total_colab, use_container_width=True)
-    
-    with tab3:
-        # POR ROTA E REGIONAL (HH:MM:SS)
-        c1, c2 = st.columns(2)
-        
-        with c1:
-            rota_medias = df_filtrado.groupby("Rota")["Horas_Liquidas"].mean().reset_index()
-            rota_medias['Tempo_Formatado'] = rota_medias['Horas_Liquidas'].apply(horas_para_tempo)
-            fig_rota = px.bar(
-                rota_medias, x="Rota", y="Horas_Liquidas", 
-                text="Tempo_Formatado", title="Média de Horas por Rota",
-                labels={"Horas_Liquidas": "Média Horas", "Rota": "Rota"},
-                color="Horas_Liquidas", 
-                color_continuous_scale="Sunsetdark"
-            )
-            fig_rota.update_traces(
-                textposition='outside',
-                cliponaxis=False,
-                hovertemplate="<b>Rota:</b> %{x}<br><b>Horas Trabalhadas:</b> %{text}<extra></extra>"
-            )
-            max_y_rota = rota_medias['Horas_Liquidas'].max() * 1.2
-            fig_rota.update_layout(
-                height=450, showlegend=False, 
-                coloraxis_showscale=False, xaxis_tickangle=-45,
-                yaxis=dict(range=[0, max_y_rota]),
-                margin=dict(t=50)
-            )
-            st.plotly_chart(fig_rota, use_container_width=True)
-            
-        with c2:
-            reg_medias = df_filtrado.groupby("Regional")["Horas_Liquidas"].mean().reset_index()
-            reg_medias['Tempo_Formatado'] = reg_medias['Horas_Liquidas'].apply(horas_para_tempo)
-            fig_reg = px.bar(
-                reg_medias, x="Regional", y="Horas_Liquidas", 
-                text="Tempo_Formatado", title="Média de Horas por Regional",
-                labels={"Horas_Liquidas": "Média Horas", "Regional": "Regional"},
-                color="Horas_Liquidas", 
-                color_continuous_scale="Sunsetdark"
-            )
-            fig_reg.update_traces(
-                textposition='outside',
-                cliponaxis=False,
-                hovertemplate="<b>Regional:</b> %{x}<br><b>Horas Trabalhadas:</b> %{text}<extra></extra>"
-            )
-            max_y_reg = reg_medias['Horas_Liquidas'].max() * 1.2
-            fig_reg.update_layout(
-                height=450, showlegend=False, 
-                coloraxis_showscale=False, xaxis_tickangle=-45,
-                yaxis=dict(range=[0, max_y_reg]),
-                margin=dict(t=50)
-            )
-            st.plotly_chart(fig_reg, use_container_width=True)
+        parar()
 
-    with tab4:
-        # EVOLUÇÃO TEMPORAL (HH:MM:SS)
-        tempo_evolucao = df_filtrado.groupby("Data")["Horas_Liquidas"].mean().reset_index()
-        tempo_evolucao['Tempo_Formatado'] = tempo_evolucao['Horas_Liquidas'].apply(horas_para_tempo)
-        
-        fig_evolucao = px.line(
-            tempo_evolucao, x="Data", y="Horas_Liquidas", 
-            title="Evolução da Média de Horas Líquidas ao Longo do Tempo",
-            labels={"Horas_Liquidas": "Média Horas", "Data": "Data"},
-            markers=True
-        )
-        fig_evolucao.add_hline(y=8, line_dash="dash", line_color="red", annotation_text="Meta 08:00:00")
-        fig_evolucao.update_traces(
-            line_color='#ff4b2b', line_width=3, 
-            mode="lines+markers", 
-            hovertemplate="<b>Data:</b> %{x}<br><b>Horas Trabalhadas:</b> %{customdata}<extra></extra>", 
-            customdata=tempo_evolucao['Tempo_Formatado']
-        )
-        fig_evolucao.update_layout(
-            height=450,
-            xaxis=dict(
-                tickformat="%d/%m/%Y",  # Formato brasileiro numérico para evitar inglês
-                title="Data"
-            )
-        )
-        st.plotly_chart(fig_evolucao, use_container_width=True)
-        
-        # Heatmap (Tradução e Formatação HH:MM:SS)
-        df_filtrado['DiaSemana'] = df_filtrado['Data'].dt.day_name()
-        df_filtrado['Semana'] = df_filtrado['Data'].dt.isocalendar().week
-        
-        heatmap_counts = df_filtrado.groupby(['DiaSemana', 'Semana'])['Horas_Liquidas'].mean().unstack().fillna(0)
-        dias_ordem = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        dias_pt = {
-            'Monday': 'Segunda', 'Tuesday': 'Terça', 'Wednesday': 'Quarta', 
-            'Thursday': 'Quinta', 'Friday': 'Sexta', 'Saturday': 'Sábado', 'Sunday': 'Domingo'
-        }
-        heatmap_counts = heatmap_counts.reindex(dias_ordem).rename(index=dias_pt)
-        
-        # Criar matriz de strings formatadas para o hover
-        hover_text = heatmap_counts.applymap(horas_para_tempo)
-        
-        fig_heatmap = px.imshow(
-            heatmap_counts,
-            labels=dict(x="", y="", color="Média Horas"),
-            x=heatmap_counts.columns,
-            y=heatmap_counts.index,
-            aspect="auto",
-            color_continuous_scale="Sunsetdark",
-            title="Frequência de Trabalho por Dia e Semana"
-        )
-        
-        fig_heatmap.update_traces(
-            hovertemplate="<b>Dia da Semana:</b> %{y}<br><b>Média Horas:</b> %{customdata}<extra></extra>",
-            customdata=hover_text
-        )
-        
-        fig_heatmap.update_layout(
-            xaxis=dict(showticklabels=False), # Remover Semana do Ano do eixo
-            coloraxis_showscale=False
-        )
-        st.plotly_chart(fig_heatmap, use_container_width=True)
+    tabs = st.tabs(
+        ["📊 Visão Geral", "👥 Por Colaborador", "🗺️ Por Rota/Regional", "📅 Evolução Temporal"],
+        key="aba_ativa", on_change="rerun"
+    )
+    for aba, secao in zip(tabs, [secao_visao_geral, secao_colaboradores, secao_rotas, secao_evolucao]):
+        with aba:
+            # Só a aba aberta é calculada e enviada ao navegador
+            if aba.open:
+                secao(agregados)
     
     # ==================== TABELA DE DADOS DETALHADA ====================
     st.markdown("---")
     st.markdown('<div class="section-header">📄 Tabela de Dados Registrados</div>', unsafe_allow_html=True)
-    
-    df_exibicao = df_filtrado[[
-        "Data_Formatada", "Colaborador", "Rota", "Regional", "MRU",
-        "Hora_inicio", "Hora_Final", "Horas_Dias", "Intervalo", "Horas_Trabalhadas"
-    ]].copy()
-    
-    df_exibicao.columns = [
-        "Data", "Colaborador", "Rota", "Regional", "MRU",
-        "Hora Início", "Hora Final", "Total Bruto", "Intervalo", "Horas Líquidas"
-    ]
-    
-    st.dataframe(df_exibicao, use_container_width=True, hide_index=True)
+    secao_tabela(motor, filtros)
     
     # ==================== BOTÕES DE EXPORTAÇÃO ====================
-    col_exp1, col_exp2 = st.columns(2)
-    
-    with col_exp1:
-        # Exportar Excel Estilizado (Movido para Coluna 1)
-        import io
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df_export = df_filtrado[[
-                "Data", "Colaborador", "Rota", "Regional", "MRU",
-                "Hora_inicio", "Hora_Final", "Horas_Dias", "Intervalo", "Horas_Trabalhadas"
-            ]].copy()
-            df_export.columns = ["Data", "Colaborador", "Rota", "Regional", "MRU", "Hora Início", "Hora Final", "Total Bruto", "Intervalo", "Horas Líquidas"]
-            df_export.to_excel(writer, index=False, sheet_name='Dashboard')
-            
-            workbook  = writer.book
-            worksheet = writer.sheets['Dashboard']
-            header_format = workbook.add_format({'bold': True, 'bg_color': '#764ba2', 'font_color': 'white', 'border': 1})
-            date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
-            time_format = workbook.add_format({'num_format': 'hh:mm:ss'})
-            text_format = workbook.add_format({'num_format': '@'}) # Formato de texto para preservar zeros à esquerda
-            
-            for col_num, value in enumerate(df_export.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-            
-            worksheet.set_column('A:A', 12, date_format)
-            worksheet.set_column('B:D', 25)
-            worksheet.set_column('E:E', 15, text_format) # MRU como texto
-            worksheet.set_column('F:J', 15, time_format)
-            
-        st.download_button(
-            label="📥 Baixar Excel",
-            data=output.getvalue(),
-            file_name=f"horas_trabalhadas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
-        )
-
-    with col_exp2:
-        # Exportar CSV (Mantido apenas um botão na Coluna 2)
-        csv = df_exibicao.to_csv(index=False, sep=';', encoding='utf-8-sig').encode('utf-8-sig')
-        st.download_button(
-            label="📥 Baixar CSV", 
-            data=csv, 
-            file_name=f"horas_trabalhadas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", 
-            mime="text/csv", 
-            use_container_width=True
-        )
+    secao_exportacao(motor, filtros, chave_estado(origens_consulta, sequencia_armazem, filtros))
     
     # ==================== ESTATÍSTICAS ADICIONAIS ====================
     st.markdown("---")
@@ -689,14 +884,14 @@ if arquivo:
     
     with col1:
         st.info(f"""
-        **📈 Total de Registros:** {len(df_filtrado)}  
-        **👥 Colaboradores Únicos:** {df_filtrado['Colaborador'].nunique()}  
+        **📈 Total de Registros:** {int(agregados['total']['Registros'])}  
+        **👥 Colaboradores Únicos:** {int(agregados['total']['Colaboradores'])}  
         **📅 Período:** {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}
         """)
     
     with col2:
-        total_horas = df_filtrado['Horas_Liquidas'].sum()
-        media_geral = df_filtrado['Horas_Liquidas'].mean()
+        total_horas = agregados['total']['Soma']
+        media_geral = agregados['total']['Horas_Liquidas']
         st.success(f"""
         **⏱️ Total de Horas Líquidas:** {horas_para_tempo(total_horas)}  
         **📊 Média Geral:** {horas_para_tempo(media_geral)}  
@@ -704,8 +899,8 @@ if arquivo:
         """)
     
     with col3:
-        max_horas = df_filtrado['Horas_Liquidas'].max()
-        min_horas = df_filtrado['Horas_Liquidas'].min()
+        max_horas = agregados['total']['Maximo']
+        min_horas = agregados['total']['Minimo']
         st.warning(f"""
         **🔝 Maior Jornada:** {horas_para_tempo(max_horas)}  
         **🔻 Menor Jornada:** {horas_para_tempo(min_horas)}  
@@ -725,7 +920,7 @@ else:
 <h3 style="margin: 0; color: #01579b;">👋 Bem-vindo ao Dashboard de Horas Trabalhadas!</h3>
 </div>
 <br>
-<p style="color: #0277bd; margin-bottom: 10px;">Para começar, faça o upload do arquivo Excel na barra lateral.</p>
+<p style="color: #0277bd; margin-bottom: 10px;">Para começar, faça o upload de um ou mais arquivos Excel na barra lateral.</p>
 <b style="color: #01579b;">Recursos disponíveis:</b>
 <ul style="color: #0277bd; margin-top: 5px;">
 <li>📊 Visualizações interativas e profissionais</li>
@@ -738,9 +933,12 @@ else:
 <b style="color: #01579b;">Instruções:</b>
 <ol style="color: #0277bd; margin-top: 5px;">
 <li>Clique em "Browse files" na barra lateral</li>
-<li>Selecione seu arquivo Excel (.xlsx)</li>
+<li>Selecione um ou mais arquivos Excel (.xlsx) ou CSV</li>
 <li>Aguarde o processamento</li>
 <li>Explore os dados com os filtros e gráficos!</li>
 </ol>
 </div>
-''', unsafe_allow_html=True)
\ No newline at end of file
+''', unsafe_allow_html=True)
+
+# ==================== DIAGNÓSTICO ====================
+painel_diagnostico()
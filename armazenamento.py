@@ -0,0 +1,314 @@
+import pandas as pd
+import os
+import re
+import json
+import glob
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # fcntl só existe em POSIX; fora dele vale apenas a trava entre threads
+    fcntl = None
+
+from leitura_excel import carregar_processado, get_file_hash, versao_regras, _sufixo_temporario
+from processamento import VERSAO_PROCESSAMENTO, N_INTERVALOS
+from cubo import construir_cubo, combinar_cubos
+from instrumentacao import etapa, medido
+
+# ==================== ARMAZÉM PARTICIONADO ====================
+# Layout: <ARMAZEM_DIR>/v<regras>_<processamento>/mes=AAAA-MM/regional=<nome>/part-<hash>.parquet
+# Cada arquivo importado gera suas próprias partes; nada do histórico é reprocessado.
+# Ao lado de cada parte fica o cubo pré-agregado dela (cubo-<hash>.parquet).
+ARMAZEM_DIR = os.environ.get("ARMAZEM_DIR", ".armazem_parquet")
+COLUNAS_DIMENSAO = ["Colaborador", "Rota", "Regional", "MRU"]
+
+_lock = threading.Lock()
+
+
+def diretorio_armazem(base=ARMAZEM_DIR):
+    """Diretório versionado: mudanças de limpeza/processamento começam um armazém novo"""
+    return os.path.join(base, f"v{versao_regras()}_{VERSAO_PROCESSAMENTO}n{N_INTERVALOS}")
+
+
+@contextmanager
+def _travado(raiz):
+    """
+    Exclusão mútua na escrita do armazém: entre threads (`_lock`) e entre processos
+    (flock em `<raiz>/.lock`), já que o dashboard e o `precalcular.py` podem importar ao
+    mesmo tempo e o manifesto é um ler-alterar-gravar.
+    """
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(raiz, exist_ok=True)
+        with open(os.path.join(raiz, ".lock"), "a") as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+def _nome_particao(valor):
+    if pd.isna(valor):
+        return "sem_regional"
+    return re.sub(r"[^\w.-]+", "_", str(valor)).strip("_") or "sem_regional"
+
+
+def _caminho_manifesto(raiz):
+    return os.path.join(raiz, "manifesto.json")
+
+
+def ler_manifesto(base=ARMAZEM_DIR):
+    """Arquivos já importados: hash -> nome, sequência de importação, linhas e período"""
+    caminho = _caminho_manifesto(diretorio_armazem(base))
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"sequencia": 0, "arquivos": {}}
+
+
+def _gravar_atomico(escrever, destino):
+    temp_path = f"{destino}.{_sufixo_temporario()}.tmp"
+    try:
+        escrever(temp_path)
+        os.replace(temp_path, destino)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _gravar_manifesto(manifesto, raiz):
+    def escrever(caminho):
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    _gravar_atomico(escrever, _caminho_manifesto(raiz))
+
+
+def _caminho_cubo(parte):
+    pasta, nome = os.path.split(parte)
+    return os.path.join(pasta, "cubo-" + nome[len("part-"):])
+
+
+def _gravar_cubo(df, parte):
+    cubo = construir_cubo(df)
+    _gravar_atomico(lambda caminho: cubo.to_parquet(caminho, compression="snappy", index=False), _caminho_cubo(parte))
+
+
+def _gravar_parte(df, parte):
+    """Grava a parte e o cubo correspondente (sempre juntos, para o cubo nunca ficar defasado)"""
+    _gravar_atomico(lambda caminho: df.to_parquet(caminho, compression="snappy", index=False), parte)
+    _gravar_cubo(df, parte)
+
+
+def importar_arquivo(arquivo, base=ARMAZEM_DIR, progresso=None, file_hash=None):
+    """
+    Importação INCREMENTAL de um arquivo no armazém:
+    1. Arquivo já importado (mesmo hash) -> nada a fazer.
+    2. Lê/processa só este arquivo (com o cache Parquet de `carregar_processado`).
+    3. Grava uma parte por (mês, Regional) e registra no manifesto (com a sequência de
+       importação, usada na leitura pela regra de duplicidade). Partes já gravadas não mudam.
+    Retorna o hash do arquivo (identificador da origem no armazém).
+    `file_hash` já calculado pelo chamador evita reler o arquivo só para o hash.
+    """
+    file_hash = file_hash or get_file_hash(arquivo)
+    raiz = diretorio_armazem(base)
+
+    # A trava entre processos cobre só a checagem e a atualização do manifesto: a leitura e
+    # a gravação das partes (o trabalho pesado) correm fora dela. Partes de uma importação
+    # ainda não registrada no manifesto são ignoradas pela leitura (ver `_listar_partes`).
+    with _travado(raiz):
+        if file_hash in ler_manifesto(base)["arquivos"]:
+            return file_hash
+
+    df = carregar_processado(arquivo, progresso=progresso, file_hash=file_hash)
+    df = df[df["Data"].notna()]
+    meses = df["Data"].dt.strftime("%Y-%m")
+
+    with etapa("gravar_armazem", linhas=len(df)) as medida:
+        os.makedirs(raiz, exist_ok=True)
+        grupos = df.groupby([meses, df["Regional"].astype(object).map(_nome_particao)], observed=True)
+        for (mes, regional), parte in grupos:
+            pasta = os.path.join(raiz, f"mes={mes}", f"regional={regional}")
+            os.makedirs(pasta, exist_ok=True)
+            _gravar_parte(parte, os.path.join(pasta, f"part-{file_hash}.parquet"))
+        medida["partes"] = grupos.ngroups
+
+    with _travado(raiz):
+        manifesto = ler_manifesto(base)
+        if file_hash in manifesto["arquivos"]:
+            return file_hash  # outro processo importou o mesmo arquivo (partes idênticas)
+        manifesto["sequencia"] += 1
+        manifesto["arquivos"][file_hash] = {
+            "nome": getattr(arquivo, "name", ""),
+            "sequencia": manifesto["sequencia"],
+            "linhas": int(len(df)),
+            "data_min": df["Data"].min().isoformat() if len(df) else None,
+            "data_max": df["Data"].max().isoformat() if len(df) else None,
+            "importado_em": datetime.now().isoformat(timespec="seconds"),
+        }
+        _gravar_manifesto(manifesto, raiz)
+    return file_hash
+
+
+def periodo_armazem(origens=None, base=ARMAZEM_DIR, manifesto=None):
+    """
+    (data_min, data_max) das origens informadas (None = armazém inteiro), pelo manifesto
+    (`manifesto` já lido pelo chamador evita reler o arquivo)
+    """
+    arquivos = (manifesto or ler_manifesto(base))["arquivos"]
+    infos = [info for h, info in arquivos.items() if (origens is None or h in origens) and info["data_min"]]
+    if not infos:
+        return None, None
+    return (
+        pd.Timestamp(min(info["data_min"] for info in infos)),
+        pd.Timestamp(max(info["data_max"] for info in infos)),
+    )
+
+
+def _mes_no_periodo(mes, data_inicio, data_fim):
+    periodo = pd.Period(mes, freq="M")
+    if data_inicio is not None and periodo.end_time < pd.Timestamp(data_inicio):
+        return False
+    if data_fim is not None and periodo.start_time > pd.Timestamp(data_fim):
+        return False
+    return True
+
+
+def _origem(parte):
+    return os.path.basename(parte)[5:-8]
+
+
+def _mes(parte):
+    return os.path.basename(os.path.dirname(os.path.dirname(parte)))[4:]
+
+
+def _listar_partes(raiz, data_inicio, data_fim, origens, sequencias):
+    """
+    Partes das origens informadas nos meses do período, agrupadas por mês (todas as Regionais).
+    Só entram origens registradas no manifesto (`sequencias`): importações em andamento ficam de fora.
+    """
+    meses = []
+    for pasta_mes in sorted(glob.glob(os.path.join(raiz, "mes=*"))):
+        if not _mes_no_periodo(os.path.basename(pasta_mes)[4:], data_inicio, data_fim):
+            continue
+        partes = [
+            parte for parte in sorted(glob.glob(os.path.join(pasta_mes, "regional=*", "part-*.parquet")))
+            if _origem(parte) in sequencias and (origens is None or _origem(parte) in origens)
+        ]
+        if partes:
+            meses.append(partes)
+    return meses
+
+
+def meses_armazem(data_inicio=None, data_fim=None, origens=None, base=ARMAZEM_DIR):
+    """
+    Meses ("AAAA-MM") com partes das origens informadas que `ler_armazem` leria para o período.
+    A leitura só poda por mês, então este conjunto (e não as datas exatas) identifica o recorte.
+    """
+    partes_por_mes = _listar_partes(diretorio_armazem(base), data_inicio, data_fim, origens, _sequencias(base))
+    return [_mes(partes[0]) for partes in partes_por_mes]
+
+
+def _selecionadas(partes, regionais):
+    if regionais is None:
+        return partes
+    nomes = {_nome_particao(r) for r in regionais}
+    return [parte for parte in partes if os.path.basename(os.path.dirname(parte))[9:] in nomes]
+
+
+def _ler_mes(partes, selecionadas, sequencias):
+    """
+    Regra de duplicidade (determinística), aplicada na leitura: para o mesmo Colaborador+Data
+    vale o registro da origem importada por ÚLTIMO (maior `sequencia` do manifesto) entre as
+    origens lidas. As partes gravadas nunca são alteradas, então restringir as origens devolve
+    exatamente o que cada arquivo trouxe. As partes de outras Regionais do mês entram só com
+    as chaves, porque o mesmo Colaborador pode ter mudado de Regional entre os arquivos.
+    Retorna (linhas das partes selecionadas, houve registro substituído).
+    """
+    if len({_origem(parte) for parte in partes}) == 1:
+        return pd.concat([pd.read_parquet(parte) for parte in selecionadas], ignore_index=True), False
+
+    blocos = []
+    for parte in partes:
+        selecionada = parte in selecionadas
+        bloco = pd.read_parquet(parte, columns=None if selecionada else ["Colaborador", "Data"])
+        bloco["Colaborador"] = bloco["Colaborador"].astype(object)
+        bloco["_sequencia"] = sequencias.get(_origem(parte), 0)
+        bloco["_selecionada"] = selecionada
+        blocos.append(bloco)
+    df = pd.concat(blocos, ignore_index=True)
+    vigente = df.groupby(["Colaborador", "Data"], dropna=False, observed=True)["_sequencia"].transform("max")
+    manter = df["_sequencia"].eq(vigente)
+    df = df[df["_selecionada"]]
+    substituidos = not manter[df.index].all()
+    df = df[manter[df.index]].drop(columns=["_sequencia", "_selecionada"])
+    return df.reset_index(drop=True), substituidos
+
+
+def _sequencias(base):
+    return {h: info["sequencia"] for h, info in ler_manifesto(base)["arquivos"].items()}
+
+
+@medido("ler_armazem")
+def ler_armazem(data_inicio=None, data_fim=None, origens=None, regionais=None, base=ARMAZEM_DIR):
+    """
+    Lê do armazém apenas as partições que interessam:
+    - meses que se sobrepõem ao período [data_inicio, data_fim]
+    - Regionais informadas (None = todas)
+    - partes das origens (hashes) informadas (None = todas)
+    As dimensões voltam como Categorical ordenado, como em `carregar_dados`.
+    """
+    sequencias = _sequencias(base)
+    blocos = []
+    for partes in _listar_partes(diretorio_armazem(base), data_inicio, data_fim, origens, sequencias):
+        selecionadas = _selecionadas(partes, regionais)
+        if selecionadas:
+            blocos.append(_ler_mes(partes, selecionadas, sequencias)[0])
+    if not blocos:
+        return None
+
+    df = pd.concat(blocos, ignore_index=True)
+    for coluna in COLUNAS_DIMENSAO:
+        df[coluna] = df[coluna].astype("category").cat.remove_unused_categories()
+    return df.sort_values(["Colaborador", "Data"], ignore_index=True)
+
+
+@medido("ler_cubo")
+def ler_cubo(data_inicio=None, data_fim=None, origens=None, regionais=None, base=ARMAZEM_DIR, dados=None):
+    """
+    Cubo pré-agregado das mesmas partições de `ler_armazem`, combinado em um só.
+    Partes gravadas antes da existência do cubo ganham o cubo na primeira leitura (só o
+    arquivo do cubo é gravado; a parte não muda).
+    Nos meses com mais de uma origem, os cubos das partes somariam as duas versões dos
+    registros substituídos: o cubo desses meses sai das linhas vigentes. `dados` é o
+    resultado de `ler_armazem` com os mesmos argumentos; informado, esses meses são
+    agregados dele em vez de as partes serem relidas.
+    """
+    sequencias = _sequencias(base)
+    cubos = []
+    for partes in _listar_partes(diretorio_armazem(base), data_inicio, data_fim, origens, sequencias):
+        selecionadas = _selecionadas(partes, regionais)
+        if not selecionadas:
+            continue
+        if len({_origem(parte) for parte in partes}) > 1:
+            if dados is not None:
+                mes = pd.Period(_mes(partes[0]), freq="M")
+                no_mes = (dados["Data"] >= mes.start_time) & (dados["Data"] < (mes + 1).start_time)
+                cubos.append(construir_cubo(dados[no_mes]))
+                continue
+            df, substituidos = _ler_mes(partes, selecionadas, sequencias)
+            if substituidos:
+                cubos.append(construir_cubo(df))
+                continue
+        for parte in selecionadas:
+            caminho = _caminho_cubo(parte)
+            if not os.path.exists(caminho):
+                # Gravação atômica e idempotente: dispensa a trava do armazém
+                _gravar_cubo(pd.read_parquet(parte), parte)
+            cubos.append(pd.read_parquet(caminho))
+    return combinar_cubos(cubos)
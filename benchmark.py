@@ -0,0 +1,320 @@
+"""
+Benchmark da soma dos N maiores intervalos em `preparar_dados`.
+
+Compara o caminho antigo (lambda por grupo) com o kernel vetorizado
+(`soma_maiores_intervalos`) em dados sintéticos e confere se os resultados batem.
+Com `--paralelo`, compara `preparar_dados` serial com `preparar_dados_paralelo`
+e confere se as saídas são idênticas (valores, dtypes, categorias e ordem).
+Com `--suite`, mede cada etapa do dashboard (carga fria/quente, `preparar_dados`,
+índice e máscara dos filtros, cada conjunto de agregação, cubo, paginação e formatação)
+sobre exportações geradas por `dados_sinteticos.py`, com tempo e pico de memória,
+e grava o resultado em JSON para comparar versões (`--comparar anterior.json`).
+
+Uso:
+    python benchmark.py                 # 10k, 100k e 1M grupos
+    python benchmark.py 10000 50000     # escalas personalizadas
+    python benchmark.py --paralelo 1000000 4000000 [--processos 4]   # linhas brutas
+    python benchmark.py --suite 100000 1000000 --saida resultados.json [--formatos csv] [--comparar anterior.json]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from processamento import soma_maiores_intervalos, preparar_dados, preparar_dados_paralelo, N_INTERVALOS
+from processamento import PARALELO_PROCESSOS
+from processamento import VERSAO_PROCESSAMENTO, formatar_exibicao
+
+ESCALAS_PADRAO = [10_000, 100_000, 1_000_000]
+LINHAS_POR_GRUPO = 5
+
+
+def gerar_intervalos(n_grupos, linhas_por_grupo=LINHAS_POR_GRUPO, seed=42):
+    """Frame sintético já ordenado como em `preparar_dados` (Colaborador, Data, Intervalo desc)"""
+    rng = np.random.default_rng(seed)
+    n_colab = max(1, n_grupos // 30)
+    grupo = np.repeat(np.arange(n_grupos), rng.integers(1, 2 * linhas_por_grupo, n_grupos))
+    intervalos = rng.random(len(grupo)) * 2
+    intervalos[rng.random(len(grupo)) < 0.02] = np.nan  # células vazias/inválidas
+    df = pd.DataFrame({
+        "Colaborador": (grupo // 30 % n_colab).astype(str),
+        "Data": pd.Timestamp("2026-01-01") + pd.to_timedelta(grupo % 30, unit="D"),
+        "Intervalo_Decimal": intervalos,
+    })
+    return df.sort_values(["Colaborador", "Data", "Intervalo_Decimal"], ascending=[True, True, False])
+
+
+def caminho_lambda(df, n_intervalos=N_INTERVALOS):
+    return df.groupby(["Colaborador", "Data"], sort=False, observed=True)["Intervalo_Decimal"].agg(
+        lambda x: x.head(n_intervalos).sum()
+    )
+
+
+def caminho_vetorizado(df, n_intervalos=N_INTERVALOS):
+    top_n = soma_maiores_intervalos(df, ["Colaborador", "Data"], n_intervalos)
+    return top_n.groupby([df["Colaborador"], df["Data"]], sort=False, observed=True).sum()
+
+
+def gerar_bruto(n_linhas, n_colaboradores=5_000, seed=42):
+    """Frame bruto sintético no formato de `carregar_dados` (dimensões Categorical, horas decimais)"""
+    rng = np.random.default_rng(seed)
+    colab = rng.integers(0, n_colaboradores, n_linhas)
+    rota = colab % 300
+    df = pd.DataFrame({
+        "Data": pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 90, n_linhas), unit="D"),
+        "Rota": pd.Categorical.from_codes(rota, [f"R{i:03d}" for i in range(300)]),
+        "Regional": pd.Categorical.from_codes(rota % 5, ["Centro", "Leste", "Norte", "Oeste", "Sul"]),
+        "MRU": pd.Categorical.from_codes(rng.integers(0, 2_000, n_linhas), [f"{i:08d}" for i in range(2_000)]),
+        "Hora_Decimal": rng.uniform(6, 20, n_linhas),
+        "Colaborador": pd.Categorical.from_codes(colab, [f"Colab {i:05d}" for i in range(n_colaboradores)]),
+        "Intervalo_Decimal": rng.random(n_linhas) * 2,
+    })
+    df.loc[rng.random(n_linhas) < 0.01, "Hora_Decimal"] = np.nan
+    df.loc[rng.random(n_linhas) < 0.001, "Colaborador"] = np.nan
+    return df
+
+
+def comparar_paralelo(escalas, processos=None):
+    """Serial x paralelo com pelo menos 2 processos (com 1, o paralelo cairia no caminho serial)"""
+    processos = max(2, processos or PARALELO_PROCESSOS)
+    print(f"processos: {processos}")
+    print(f"{'linhas':>10} {'serial (s)':>12} {'paralelo (s)':>13} {'ganho':>8}")
+    for n_linhas in escalas:
+        df = gerar_bruto(n_linhas)
+        ref, t_serial = cronometrar(preparar_dados, df.copy())
+        par, t_par = cronometrar(preparar_dados_paralelo, df.copy(), N_INTERVALOS, processos, 0)
+        pd.testing.assert_frame_equal(ref, par)
+        print(f"{n_linhas:>10} {t_serial:>12.3f} {t_par:>13.3f} {t_serial / t_par:>7.1f}x")
+
+
+def cronometrar(func, *args):
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+# ==================== SUÍTE DE ETAPAS DO DASHBOARD ====================
+ESCALAS_SUITE = [10_000, 100_000, 1_000_000]
+
+
+def _rss_kb(campo):
+    with open("/proc/self/status") as status:
+        return int(re.search(rf"{campo}:\s+(\d+)", status.read()).group(1))
+
+
+def medir(func, *args):
+    """
+    Executa `func(*args)` uma vez e retorna (resultado, {"segundos", "pico_mb"}).
+    No Linux o pico é o da memória residente do processo (inclui buffers do Arrow e do DuckDB),
+    zerado antes da etapa via /proc/self/clear_refs; fora dele, o pico do tracemalloc
+    (só alocações do Python/NumPy, e com custo extra no tempo).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as refs:
+            refs.write("5")
+        base, usa_proc = _rss_kb("VmRSS"), True
+    except OSError:
+        tracemalloc.start()
+        usa_proc = False
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    segundos = time.perf_counter() - inicio
+    if usa_proc:
+        pico = (_rss_kb("VmHWM") - base) * 1024
+    else:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return resultado, {"segundos": round(segundos, 6), "pico_mb": round(max(pico, 0) / 1024 ** 2, 2)}
+
+
+def _versoes():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    from leitura_excel import versao_regras
+    return {
+        "commit": commit,
+        "processamento": VERSAO_PROCESSAMENTO,
+        "regras": versao_regras(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+        "duckdb": duckdb.__version__,
+    }
+
+
+def _carregar(caminho):
+    from leitura_excel import carregar_dados
+    with open(caminho, "rb") as arquivo:
+        return carregar_dados(arquivo)
+
+
+def _filtros_amostra(df, indice):
+    """Filtro típico do dashboard: metade final do período, 3 rotas e uma faixa de horas"""
+    from consultas import filtros_vazios
+    datas = df["Data"].dropna()
+    inicio, fim = datas.min().date(), datas.max().date()
+    filtros = filtros_vazios(inicio + (fim - inicio) / 2, fim)
+    filtros["rotas"] = indice.opcoes("Rota")[:3]
+    filtros["faixa"] = 3
+    return filtros
+
+
+def etapas_escala(n_linhas, diretorio, formatos=("csv", "xlsx"), n_colaboradores=None, n_mrus=5_000, n_dias=30):
+    """Mede as etapas em uma escala; os caches Parquet ficam em `diretorio` (removido a cada carga fria)"""
+    from dados_sinteticos import gerar_arquivos
+    from indices import IndiceFiltros
+    from consultas import CONJUNTOS, MotorConsultas, agrupar_outros, filtros_vazios, heatmap_por_data
+    from cubo import construir_cubo
+
+    n_colaboradores = n_colaboradores or max(50, n_linhas // 300)
+    caminhos = gerar_arquivos(
+        os.path.join(diretorio, f"sintetico_{n_linhas}"), n_linhas, n_colaboradores, n_mrus, n_dias, formatos
+    )
+    etapas = {}
+
+    # 1. Carga fria (hash + leitura + conversão + gravação do cache) e quente (cache Parquet)
+    df_raw = None
+    for formato, caminho in caminhos.items():
+        shutil.rmtree(".cache_parquet", ignore_errors=True)
+        df_raw, etapas[f"carga_fria_{formato}"] = medir(_carregar, caminho)
+        _, etapas[f"carga_quente_{formato}"] = medir(_carregar, caminho)
+
+    # 2. Agregação por Colaborador/dia (serial)
+    df, etapas["preparar_dados"] = medir(preparar_dados, df_raw.copy())
+
+    # 3. Índice dos filtros e máscara
+    indice, etapas["indice_filtros"] = medir(IndiceFiltros, df)
+    filtros = _filtros_amostra(df, indice)
+    datas = df["Data"].dropna()
+    todos = filtros_vazios(datas.min().date(), datas.max().date())
+    _, etapas["mascara_filtros"] = medir(indice.mascara, filtros)
+
+    # 4. Agregações do dashboard: cada conjunto isolado e a consulta completa (sem memo);
+    #    o "total" não tem dimensões e só sai junto com os demais
+    motor, etapas["motor_consultas"] = medir(MotorConsultas, df)
+    for conjunto in [c for c in CONJUNTOS if CONJUNTOS[c]]:
+        _, etapas[f"agregado_{conjunto}"] = medir(motor._consultar, "dados", [conjunto], todos)
+    agregados, etapas["agregados_sem_filtro"] = medir(motor._agregados, todos)
+    _, etapas["agregados_filtrados"] = medir(motor._agregados, filtros)
+    _, etapas["heatmap"] = medir(heatmap_por_data, agregados["data"])
+    _, etapas["top_n_outros"] = medir(agrupar_outros, agregados["colaborador"], "Colaborador", 30)
+
+    # 5. Mesmas agregações com o cubo pré-agregado
+    cubo, etapas["construir_cubo"] = medir(construir_cubo, df)
+    motor_cubo = MotorConsultas(df, cubo)
+    _, etapas["agregados_cubo"] = medir(motor_cubo._agregados, todos)
+
+    # 6. Tabela detalhada: primeira página ordenada e formatação do recorte filtrado
+    _, etapas["pagina_tabela"] = medir(motor.pagina, todos, "Horas_Liquidas", True)
+    _, etapas["formatar_exibicao"] = medir(formatar_exibicao, motor.linhas(filtros))
+
+    return {
+        "linhas": n_linhas,
+        "colaboradores": n_colaboradores,
+        "mrus": n_mrus,
+        "dias": n_dias,
+        "linhas_processadas": len(df),
+        "etapas": etapas,
+    }
+
+
+def suite(escalas, saida, formatos=("csv", "xlsx"), **parametros):
+    """Roda `etapas_escala` em cada escala (em um diretório temporário) e grava o JSON em `saida`"""
+    saida = os.path.abspath(saida)
+    resultado = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "versoes": _versoes(),
+        "maquina": {"plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "escalas": [],
+    }
+    original = os.getcwd()
+    for n_linhas in escalas:
+        with tempfile.TemporaryDirectory() as diretorio:
+            os.chdir(diretorio)  # .cache_parquet/ do leitor fica dentro do temporário
+            try:
+                escala = etapas_escala(n_linhas, diretorio, formatos, **parametros)
+            finally:
+                os.chdir(original)
+        resultado["escalas"].append(escala)
+        print(f"\n{n_linhas:,} linhas ({escala['linhas_processadas']:,} Colaborador/dia)")
+        print(f"{'etapa':<28} {'segundos':>10} {'pico (MB)':>10}")
+        for nome, medida in escala["etapas"].items():
+            print(f"{nome:<28} {medida['segundos']:>10.4f} {medida['pico_mb']:>10.1f}")
+
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em {saida}")
+    return resultado
+
+
+def comparar(anterior, atual, tolerancia=0.10):
+    """Razão de tempo (atual / anterior) por escala e etapa; marca variações acima de `tolerancia`"""
+    por_linhas = {e["linhas"]: e["etapas"] for e in anterior["escalas"]}
+    print(f"\nComparação com {anterior['versoes'].get('commit')} (processamento v{anterior['versoes']['processamento']})")
+    print(f"{'linhas':>10} {'etapa':<28} {'antes (s)':>10} {'agora (s)':>10} {'razão':>7}")
+    for escala in atual["escalas"]:
+        etapas_antes = por_linhas.get(escala["linhas"], {})
+        for nome, medida in escala["etapas"].items():
+            if nome not in etapas_antes:
+                continue
+            antes = etapas_antes[nome]["segundos"]
+            razao = medida["segundos"] / antes if antes else float("inf")
+            marca = " <- regressão" if razao > 1 + tolerancia else (" <- ganho" if razao < 1 - tolerancia else "")
+            print(f"{escala['linhas']:>10} {nome:<28} {antes:>10.4f} {medida['segundos']:>10.4f} {razao:>6.2f}x{marca}")
+
+
+def main(escalas):
+    print(f"{'grupos':>10} {'linhas':>10} {'lambda (s)':>12} {'vetorizado (s)':>15} {'ganho':>8}")
+    for n_grupos in escalas:
+        df = gerar_intervalos(n_grupos)
+        ref, t_lambda = cronometrar(caminho_lambda, df)
+        vet, t_vet = cronometrar(caminho_vetorizado, df)
+        np.testing.assert_allclose(ref.to_numpy(), vet.to_numpy())
+        print(f"{n_grupos:>10} {len(df):>10} {t_lambda:>12.3f} {t_vet:>15.3f} {t_lambda / t_vet:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do processamento e das etapas do dashboard.")
+    parser.add_argument("escalas", nargs="*", type=int)
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--paralelo", action="store_true", help="preparar_dados serial x paralelo")
+    modo.add_argument("--suite", action="store_true", help="Etapas do dashboard com saída em JSON")
+    parser.add_argument("--processos", type=int, default=None, help="--paralelo: padrão PARALELO_PROCESSOS (mínimo 2)")
+    parser.add_argument("--formatos", nargs="+", choices=["csv", "xlsx"], default=["csv", "xlsx"])
+    parser.add_argument("--colaboradores", type=int, default=None, help="Padrão: linhas / 300")
+    parser.add_argument("--mrus", type=int, default=5_000)
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--saida", default="benchmark_resultados.json")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior da suíte")
+    args = parser.parse_args()
+
+    if args.paralelo:
+        comparar_paralelo(args.escalas or [1_000_000, 4_000_000], args.processos)
+    elif args.suite:
+        atual = suite(
+            args.escalas or ESCALAS_SUITE, args.saida, args.formatos,
+            n_colaboradores=args.colaboradores, n_mrus=args.mrus, n_dias=args.dias,
+        )
+        if args.comparar:
+            with open(args.comparar, encoding="utf-8") as arquivo:
+                comparar(json.load(arquivo), atual)
+    else:
+        main(args.escalas or ESCALAS_PADRAO)
@@ -0,0 +1,264 @@
+import pandas as pd
+import numpy as np
+import duckdb
+import threading
+import json
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+
+from indices import IndiceFiltros
+from instrumentacao import etapa
+from processamento import LIMITES_FAIXAS, COLUNAS_TEMPO
+
+# ==================== MOTOR DE CONSULTAS (DuckDB) ====================
+# Conjuntos de agrupamento respondidos em UMA varredura (GROUPING SETS).
+# O heatmap (dia da semana x semana) é derivado do conjunto "data", sem nova varredura.
+# Com o cubo pré-agregado (cubo.py) disponível e sem filtro de Colaborador, só o conjunto
+# "colaborador" varre o dataset; os demais saem do cubo.
+DIMENSOES = ["Colaborador", "Rota", "Regional", "MRU", "Data"]
+CONJUNTOS = {
+    "colaborador": ["Colaborador"],
+    "rota": ["Rota"],
+    "regional": ["Regional"],
+    "mru": ["MRU"],
+    "data": ["Data"],
+    "total": [],
+}
+# Tabela detalhada paginada: colunas devolvidas e colunas onde a busca textual procura
+COLUNAS_DETALHE = ["Data", "Colaborador", "Rota", "Regional", "MRU"] + list(COLUNAS_TEMPO)
+COLUNAS_BUSCA = ["Colaborador", "Rota", "Regional", "MRU"]
+# Agregações memorizadas por estado dos filtros (reruns que não mudam filtros não consultam de novo)
+MAX_MEMO_AGREGADOS = 16
+
+
+def _grouping_id(colunas, dimensoes=DIMENSOES):
+    """Valor de GROUPING(dimensoes...) para um conjunto: bit 1 = coluna fora do agrupamento"""
+    gid = 0
+    for coluna in dimensoes:
+        gid = (gid << 1) | (0 if coluna in colunas else 1)
+    return gid
+
+
+def filtros_vazios(data_inicio, data_fim):
+    """Estrutura de filtros usada pelo dashboard (None = sem restrição)"""
+    return {
+        "data_inicio": data_inicio,
+        "data_fim": data_fim,
+        "colaborador": None,
+        "rotas": None,
+        "regionais": None,
+        "mrus": None,
+        "faixa": None,  # índice em ROTULOS_FAIXAS; (LIMITES_FAIXAS[i], LIMITES_FAIXAS[i + 1]]
+    }
+
+
+class MotorConsultas:
+    """
+    Camada de consultas sobre o dataset processado:
+    - O DataFrame é registrado no DuckDB sem cópia, uma vez por thread: cada thread (execução
+      de sessão) consulta pelo seu cursor, então sessões que compartilham o motor (registro.py)
+      não fazem fila umas atrás das outras; só o memo de `agregados` é protegido por trava
+    - Todas as agregações do dashboard saem de uma única consulta com GROUPING SETS
+      sob o predicado dos filtros ativos
+    - `indice` responde as máscaras de linhas e as listas de opções da sidebar
+    - `cubo` (opcional) é o cubo pré-agregado do mesmo recorte (ver cubo.py)
+    """
+
+    def __init__(self, df, cubo=None):
+        self.df = df
+        self.cubo = cubo
+        with etapa("indice_filtros", linhas=len(df)):
+            self.indice = IndiceFiltros(df)
+        self._con = duckdb.connect(database=":memory:")
+        self._cursores = threading.local()
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()
+        # Horas compactas (float32, ver DADOS_COMPACTOS) entram nas somas alargadas para DOUBLE
+        # e arredondadas ao segundo, como `horas_float64`: totais idênticos aos do float64
+        if df["Horas_Liquidas"].dtype == np.float32:
+            self._horas = "(round(Horas_Liquidas::DOUBLE * 3600) / 3600)"
+        else:
+            self._horas = "Horas_Liquidas"
+
+    def _cursor(self):
+        """Cursor da thread atual (conexão DuckDB não é thread-safe; cursores são independentes)"""
+        cursor = getattr(self._cursores, "cursor", None)
+        if cursor is None:
+            cursor = self._con.cursor()
+            cursor.register("dados", self.df)
+            if self.cubo is not None:
+                cursor.register("cubo", self.cubo)
+            self._cursores.cursor = cursor
+        return cursor
+
+    def linhas(self, filtros):
+        """Linhas do dataset que atendem os filtros (máscara do índice; sem busca textual)"""
+        return self.df[self.indice.mascara(filtros)]
+
+    def _predicado(self, filtros, no_cubo=False):
+        # Intervalo semiaberto em timestamp: evita CAST por linha e usa a ordenação de Data
+        condicoes = ["Data >= $data_inicio AND Data < $data_fim"]
+        params = {
+            "data_inicio": datetime.combine(filtros["data_inicio"], time()),
+            "data_fim": datetime.combine(filtros["data_fim"], time()) + timedelta(days=1),
+        }
+        if filtros["colaborador"] is not None:
+            condicoes.append("CAST(Colaborador AS VARCHAR) = $colaborador")
+            params["colaborador"] = str(filtros["colaborador"])
+        for coluna, chave in (("Rota", "rotas"), ("Regional", "regionais"), ("MRU", "mrus")):
+            if filtros[chave] is not None:
+                condicoes.append(f"list_contains(${chave}, CAST({coluna} AS VARCHAR))")
+                params[chave] = [str(v) for v in filtros[chave]]
+        if filtros["faixa"] is not None:
+            if no_cubo:
+                condicoes.append("Faixa = $faixa")
+                params["faixa"] = filtros["faixa"]
+            else:
+                condicoes.append("Horas_Liquidas > $faixa_inf AND Horas_Liquidas <= $faixa_sup")
+                params["faixa_inf"] = LIMITES_FAIXAS[filtros["faixa"]]
+                params["faixa_sup"] = LIMITES_FAIXAS[filtros["faixa"] + 1]
+        return " AND ".join(condicoes), params
+
+    def _consultar(self, tabela, conjuntos, filtros):
+        """GROUPING SETS dos conjuntos pedidos sobre `dados` ou `cubo` + (mínimo, máximo) do recorte"""
+        no_cubo = tabela == "cubo"
+        predicado, params = self._predicado(filtros, no_cubo)
+        if no_cubo:
+            medidas = (
+                "coalesce(sum(Soma), 0) AS Soma, coalesce(sum(Validos), 0)::BIGINT AS Validos, "
+                "coalesce(sum(Registros), 0)::BIGINT AS Registros"
+            )
+            extremos = f"SELECT min(Minimo), max(Maximo) FROM cubo WHERE {predicado}"
+        else:
+            medidas = f"coalesce(sum({self._horas}), 0) AS Soma, count(Horas_Liquidas) AS Validos, count(*) AS Registros"
+            # min/max só interessam no total; calculá-los em todos os conjuntos dobraria o custo
+            extremos = f"SELECT min({self._horas}), max({self._horas}) FROM dados WHERE {predicado}"
+        dimensoes = [d for d in DIMENSOES if any(d in CONJUNTOS[c] for c in conjuntos)]
+        consulta = f"""
+            SELECT GROUPING({", ".join(dimensoes)}) AS gid, {", ".join(dimensoes)}, {medidas}
+            FROM {tabela}
+            WHERE {predicado}
+            GROUP BY GROUPING SETS ({", ".join("(" + ", ".join(CONJUNTOS[c]) + ")" for c in conjuntos)})
+        """
+        cursor = self._cursor()
+        resultado = cursor.execute(consulta, params).df()
+        extremos = cursor.execute(extremos, params).fetchone() if "total" in conjuntos else (None, None)
+        nomes = {_grouping_id(CONJUNTOS[c], dimensoes): c for c in conjuntos}
+        resultado["conjunto"] = resultado["gid"].map(nomes)
+        return resultado, extremos
+
+    def agregados(self, filtros):
+        """
+        Retorna um dicionário com as agregações do dashboard:
+        colaborador / rota / regional / mru / data -> [dimensão, Horas_Liquidas (média), Soma, Validos]
+        heatmap -> [DiaSemana, Semana, Horas_Liquidas]; total -> Series com estatísticas gerais
+        O resultado é memorizado por estado dos filtros e não deve ser alterado por quem chama.
+        """
+        chave = json.dumps(filtros, default=str, sort_keys=True)
+        with etapa("agregados", cubo=self.cubo is not None) as medida:
+            with self._lock:
+                if chave in self._memo:
+                    self._memo.move_to_end(chave)
+                    medida["cache"] = "hit"
+                    return self._memo[chave]
+            medida["cache"] = "miss"
+            saida = self._agregados(filtros)
+            medida["linhas"] = int(saida["total"]["Registros"])
+            with self._lock:
+                self._memo[chave] = saida
+                while len(self._memo) > MAX_MEMO_AGREGADOS:
+                    self._memo.popitem(last=False)
+            return saida
+
+    def _agregados(self, filtros):
+        if self.cubo is not None and filtros["colaborador"] is None:
+            # Só o conjunto por Colaborador precisa do dataset; o resto sai do cubo
+            resultado, (minimo, maximo) = self._consultar("cubo", [c for c in CONJUNTOS if c != "colaborador"], filtros)
+            por_colaborador, _ = self._consultar("dados", ["colaborador"], filtros)
+            resultado = pd.concat([resultado, por_colaborador], ignore_index=True)
+        else:
+            resultado, (minimo, maximo) = self._consultar("dados", list(CONJUNTOS), filtros)
+        resultado["Horas_Liquidas"] = resultado["Soma"] / resultado["Validos"].where(resultado["Validos"] > 0)
+
+        saida = {}
+        for nome, colunas in CONJUNTOS.items():
+            parte = resultado[resultado["conjunto"] == nome]
+            if nome == "total":
+                total = parte.iloc[0][["Horas_Liquidas", "Soma", "Registros"]].copy()
+                total["Minimo"], total["Maximo"] = minimo, maximo
+                saida[nome] = total
+                continue
+            # Mesmo comportamento do groupby do pandas: chaves nulas descartadas, ordem das chaves
+            parte = parte.dropna(subset=colunas).sort_values(colunas)
+            saida[nome] = parte[colunas + ["Horas_Liquidas", "Soma", "Validos"]].reset_index(drop=True)
+
+        saida["total"]["Colaboradores"] = len(saida["colaborador"])
+        saida["heatmap"] = heatmap_por_data(saida["data"])
+        return saida
+
+
+    def _predicado_busca(self, filtros, busca):
+        predicado, params = self._predicado(filtros)
+        if busca:
+            # Busca literal: %, _ e a barra invertida digitados não funcionam como curinga
+            predicado += " AND (" + " OR ".join(
+                f"CAST({c} AS VARCHAR) ILIKE $busca ESCAPE '\\'" for c in COLUNAS_BUSCA
+            ) + ")"
+            literal = busca.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params["busca"] = f"%{literal}%"
+        return predicado, params
+
+    def contar_linhas(self, filtros, busca=None):
+        """Total de linhas que atendem os filtros + busca textual (para o número de páginas)"""
+        predicado, params = self._predicado_busca(filtros, busca)
+        return self._cursor().execute(f"SELECT count(*) FROM dados WHERE {predicado}", params).fetchone()[0]
+
+    def pagina(self, filtros, ordenar_por="Data", decrescente=False, busca=None, numero=0, tamanho=100):
+        """
+        Uma página das linhas filtradas para a tabela detalhada: filtro, busca, ordenação
+        e LIMIT/OFFSET no DuckDB, sem materializar o recorte inteiro no pandas.
+        """
+        if ordenar_por not in COLUNAS_DETALHE:
+            raise ValueError(f"Coluna de ordenação inválida: {ordenar_por}")
+        predicado, params = self._predicado_busca(filtros, busca)
+        # Desempate fixo para a paginação ser estável entre reruns
+        ordem = f"{ordenar_por} {'DESC' if decrescente else 'ASC'} NULLS LAST, Colaborador, Data"
+        consulta = f"""
+            SELECT {", ".join(COLUNAS_DETALHE)} FROM dados
+            WHERE {predicado}
+            ORDER BY {ordem}
+            LIMIT $limite OFFSET $deslocamento
+        """
+        return self._cursor().execute(consulta, {**params, "limite": tamanho, "deslocamento": numero * tamanho}).df()
+
+
+def agrupar_outros(agregado, dimensao, n, por="Horas_Liquidas", rotulo="Outros"):
+    """
+    Mantém as `n` categorias com maior `por` e junta as demais em uma única linha
+    "Outros (k)". A média dessa linha sai de Soma/Validos (ponderada, não média das médias).
+    Com até `n` categorias o agregado volta inalterado.
+    """
+    if len(agregado) <= n:
+        return agregado
+    ordenado = agregado.sort_values(por, ascending=False)
+    topo, resto = ordenado.iloc[:n], ordenado.iloc[n:]
+    soma, validos = resto["Soma"].sum(), resto["Validos"].sum()
+    outros = pd.DataFrame({
+        dimensao: [f"{rotulo} ({len(resto)})"],
+        "Horas_Liquidas": [soma / validos if validos else float("nan")],
+        "Soma": [soma],
+        "Validos": [validos],
+    })
+    topo = topo.assign(**{dimensao: topo[dimensao].astype(str)})
+    return pd.concat([topo, outros], ignore_index=True)
+
+
+def heatmap_por_data(por_data):
+    """Média por (dia da semana, semana ISO) a partir das somas/contagens diárias"""
+    datas = pd.to_datetime(por_data["Data"])
+    heatmap = por_data.assign(
+        DiaSemana=datas.dt.day_name(),
+        Semana=datas.dt.isocalendar().week.to_numpy(),
+    ).groupby(["DiaSemana", "Semana"])[["Soma", "Validos"]].sum()
+    heatmap["Horas_Liquidas"] = heatmap["Soma"] / heatmap["Validos"].where(heatmap["Validos"] > 0)
+    return heatmap["Horas_Liquidas"].reset_index()
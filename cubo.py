@@ -0,0 +1,44 @@
+import pandas as pd
+import numpy as np
+
+from processamento import faixa_horas, horas_float64
+
+# ==================== CUBO PRÉ-AGREGADO ====================
+# Grão: (Data, Rota, Regional, MRU, Faixa). O processado já é 1 linha por
+# Colaborador/dia, então um grão com Colaborador seria o próprio dataset; os níveis
+# mais grossos (Rota, Regional, MRU, Data, total) saem do roll-up deste grão.
+CHAVES_CUBO = ["Data", "Rota", "Regional", "MRU", "Faixa"]
+MEDIDAS_CUBO = ["Soma", "Validos", "Registros", "Minimo", "Maximo"]
+
+
+def construir_cubo(df):
+    """
+    Agrega o dataset processado no grão do cubo com medidas combináveis:
+    soma, contagem de valores válidos, contagem de registros, mínimo e máximo de Horas_Liquidas.
+    A Faixa (Perfil de Produtividade) entra como chave, então o filtro de perfil
+    também é respondido pelo cubo.
+    """
+    # Medidas em float64 mesmo com as horas compactadas em float32 (somas de muitas linhas)
+    base = df[CHAVES_CUBO[:-1]].assign(
+        Horas_Liquidas=horas_float64(df["Horas_Liquidas"]), Faixa=faixa_horas(df["Horas_Liquidas"])
+    )
+    cubo = base.groupby(CHAVES_CUBO, observed=True, dropna=False, sort=False)["Horas_Liquidas"].agg(
+        Soma="sum", Validos="count", Registros="size", Minimo="min", Maximo="max"
+    ).reset_index()
+    cubo["Validos"] = cubo["Validos"].astype(np.int64)
+    cubo["Registros"] = cubo["Registros"].astype(np.int64)
+    return cubo
+
+
+def combinar_cubos(cubos):
+    """Une cubos de partições disjuntas reagregando as medidas no mesmo grão"""
+    cubos = [c for c in cubos if c is not None and len(c)]
+    if not cubos:
+        return None
+    unido = pd.concat(cubos, ignore_index=True)
+    for coluna in ["Rota", "Regional", "MRU"]:
+        unido[coluna] = unido[coluna].astype("category")
+    return unido.groupby(CHAVES_CUBO, observed=True, dropna=False, sort=False).agg(
+        Soma=("Soma", "sum"), Validos=("Validos", "sum"), Registros=("Registros", "sum"),
+        Minimo=("Minimo", "min"), Maximo=("Maximo", "max"),
+    ).reset_index()
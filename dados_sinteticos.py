@@ -0,0 +1,181 @@
+"""
+Gerador de exportações sintéticas no layout de 47 colunas lido por `leitura_excel`
+(posições de INDICES_FIXOS), para testes de carga e para o `benchmark.py`.
+
+Cada linha é um registro de atendimento de um Colaborador em um dia: horário do registro
+(coluna AK) e duração do intervalo (coluna AU). A Rota e a Regional acompanham o Colaborador;
+as MRUs são sorteadas entre `n_mrus` códigos (com o sufixo "-XXX" e zeros à esquerda
+omitidos que a limpeza de MRU normaliza).
+
+Uso:
+    python dados_sinteticos.py --linhas 1000000 --colaboradores 3000 --mrus 20000 --dias 90 --saida exportacao
+    (gera exportacao.csv e exportacao.xlsx; --formatos csv para só um deles)
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from leitura_excel import INDICES_FIXOS, NOMES_SISTEMA
+
+N_COLUNAS = 47
+DATA_INICIAL = "2026-01-01"
+REGIONAIS = ["Centro", "Leste", "Norte", "Oeste", "Sul"]
+# Cabeçalho das colunas lidas pelo dashboard; as demais seguem a letra da coluna
+CABECALHOS = dict(zip(INDICES_FIXOS, ["Data", "Rota", "Regional", "MRU", "Hora", "Colaborador", "Intervalo"]))
+CABECALHOS.update({1: "Ordem", 2: "Tipo", 13: "Nome MRU"})
+
+
+def letra_coluna(indice):
+    """Índice 0-based -> letra da coluna no Excel (0 -> A, 41 -> AP)"""
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord("A") + resto) + letras
+    return letras
+
+
+def _texto_horario(segundos):
+    """Segundos -> "HH:MM:SS" (vetorizado)"""
+    h, m, s = segundos // 3600, segundos % 3600 // 60, segundos % 60
+    return (
+        pd.Series(h).astype(str).str.zfill(2) + ":"
+        + pd.Series(m).astype(str).str.zfill(2) + ":"
+        + pd.Series(s).astype(str).str.zfill(2)
+    ).to_numpy()
+
+
+def gerar_registros(n_linhas, n_colaboradores=1_000, n_mrus=5_000, n_dias=30, seed=42):
+    """
+    Registros sintéticos já tipados: Data (datetime), dimensões em texto e horários em
+    segundos desde a meia-noite (`Hora_Segundos`, `Intervalo_Segundos`).
+    ~1% dos registros vem sem Colaborador e ~0,5% sem horário (células vazias).
+    """
+    rng = np.random.default_rng(seed)
+    n_rotas = max(1, n_colaboradores // 10)
+
+    colab = rng.integers(0, n_colaboradores, n_linhas)
+    rota = colab % n_rotas
+    mru = rng.integers(0, n_mrus, n_linhas)
+    # Jornada entre 06:00 e 20:00; intervalos de até 1h30, a maioria curtos
+    hora = rng.integers(6 * 3600, 20 * 3600, n_linhas)
+    intervalo = np.minimum(rng.exponential(900, n_linhas), 5400).astype(np.int64)
+
+    df = pd.DataFrame({
+        "Data": pd.Timestamp(DATA_INICIAL) + pd.to_timedelta(rng.integers(0, n_dias, n_linhas), unit="D"),
+        "Rota": pd.Categorical.from_codes(rota, [f"ROTA {i:04d}" for i in range(n_rotas)]).astype(object),
+        "Regional": pd.Categorical.from_codes(rota % len(REGIONAIS), REGIONAIS).astype(object),
+        "MRU": pd.Categorical.from_codes(
+            mru, [f"{i:07d}-{chr(ord('A') + i % 26) * 3}" for i in range(n_mrus)]
+        ).astype(object),
+        "Hora_Segundos": hora,
+        "Colaborador": pd.Categorical.from_codes(colab, [f"COLABORADOR {i:05d}" for i in range(n_colaboradores)]).astype(object),
+        "Intervalo_Segundos": intervalo,
+    })
+    df.loc[rng.random(n_linhas) < 0.01, "Colaborador"] = None
+    df["Hora_Segundos"] = df["Hora_Segundos"].astype("Int64")
+    df.loc[rng.random(n_linhas) < 0.005, "Hora_Segundos"] = pd.NA
+    return df.sort_values(["Data", "Colaborador"], kind="stable", ignore_index=True)
+
+
+def _planilha(registros):
+    """DataFrame com as 47 colunas na ordem da exportação (colunas fora do layout ficam vazias)"""
+    n = len(registros)
+    colunas = {i: np.full(n, "", dtype=object) for i in range(N_COLUNAS)}
+    colunas[1] = np.arange(1, n + 1)
+    colunas[2] = np.where(np.arange(n) % 3 == 0, "LEITURA", "ENTREGA")
+    colunas[13] = ("MRU " + registros["MRU"].str[:7]).to_numpy()
+    for indice, nome in zip(INDICES_FIXOS, NOMES_SISTEMA):
+        if nome == "Data":
+            colunas[indice] = registros["Data"].dt.strftime("%d/%m/%Y").to_numpy()
+        elif nome == "Horas_Input":
+            hora = registros["Hora_Segundos"]
+            colunas[indice] = np.where(hora.isna(), "", _texto_horario(hora.fillna(0).to_numpy(np.int64)))
+        elif nome == "Intervalos_Input":
+            colunas[indice] = _texto_horario(registros["Intervalo_Segundos"].to_numpy())
+        else:
+            colunas[indice] = registros[nome].fillna("").to_numpy()
+    planilha = pd.DataFrame(colunas)
+    planilha.columns = [CABECALHOS.get(i, letra_coluna(i)) for i in range(N_COLUNAS)]
+    return planilha
+
+
+def salvar_csv(registros, caminho):
+    """CSV (;) em UTF-8 com BOM e datas dd/mm/aaaa, como as exportações do sistema de origem"""
+    _planilha(registros).to_csv(caminho, sep=";", index=False, encoding="utf-8-sig")
+
+
+def salvar_xlsx(registros, caminho):
+    """
+    XLSX com tipos nativos: Data como data e horários como fração do dia com formato
+    hh:mm:ss (lidos como horário pelo Calamine/openpyxl). Escrito em `constant_memory`.
+    """
+    workbook = xlsxwriter.Workbook(caminho, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("Exportação")
+    date_format = workbook.add_format({"num_format": "dd/mm/yyyy"})
+    time_format = workbook.add_format({"num_format": "hh:mm:ss"})
+    worksheet.write_row(0, 0, [CABECALHOS.get(i, letra_coluna(i)) for i in range(N_COLUNAS)])
+
+    i_data, i_rota, i_regional, i_mru, i_hora, i_colab, i_intervalo = INDICES_FIXOS
+    # Serial do Excel: dias desde 1899-12-30
+    seriais = ((registros["Data"] - pd.Timestamp("1899-12-30")).dt.days).to_numpy()
+    horas = registros["Hora_Segundos"].to_numpy(dtype=np.float64, na_value=np.nan) / 86400
+    intervalos = registros["Intervalo_Segundos"].to_numpy() / 86400
+    tipos = np.where(np.arange(len(registros)) % 3 == 0, "LEITURA", "ENTREGA")
+    textos = registros[["Rota", "Regional", "MRU", "Colaborador"]].to_numpy()
+
+    for linha in range(len(registros)):
+        rota, regional, mru, colab = textos[linha]
+        worksheet.write_number(linha + 1, i_data, seriais[linha], date_format)
+        worksheet.write_number(linha + 1, 1, linha + 1)
+        worksheet.write_string(linha + 1, 2, tipos[linha])
+        worksheet.write_string(linha + 1, i_rota, rota)
+        worksheet.write_string(linha + 1, i_regional, regional)
+        worksheet.write_string(linha + 1, i_mru, mru)
+        worksheet.write_string(linha + 1, 13, "MRU " + mru[:7])
+        if not np.isnan(horas[linha]):
+            worksheet.write_number(linha + 1, i_hora, horas[linha], time_format)
+        if isinstance(colab, str):
+            worksheet.write_string(linha + 1, i_colab, colab)
+        worksheet.write_number(linha + 1, i_intervalo, intervalos[linha], time_format)
+    workbook.close()
+
+
+SALVAR = {"csv": salvar_csv, "xlsx": salvar_xlsx}
+
+
+def gerar_arquivos(prefixo, n_linhas, n_colaboradores=1_000, n_mrus=5_000, n_dias=30, formatos=("csv", "xlsx"), seed=42):
+    """Gera `prefixo.<formato>` para cada formato pedido; retorna {formato: caminho}"""
+    registros = gerar_registros(n_linhas, n_colaboradores, n_mrus, n_dias, seed)
+    caminhos = {}
+    for formato in formatos:
+        caminhos[formato] = f"{prefixo}.{formato}"
+        SALVAR[formato](registros, caminhos[formato])
+    return caminhos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera exportações sintéticas (CSV/XLSX) no layout do dashboard.")
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--colaboradores", type=int, default=1_000)
+    parser.add_argument("--mrus", type=int, default=5_000)
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--formatos", nargs="+", choices=list(SALVAR), default=list(SALVAR))
+    parser.add_argument("--saida", default="exportacao_sintetica", help="Prefixo dos arquivos gerados")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    caminhos = gerar_arquivos(args.saida, args.linhas, args.colaboradores, args.mrus, args.dias, args.formatos, args.seed)
+    for caminho in caminhos.values():
+        print(f"Gerado: {caminho}")
+    print(f"{args.linhas:,} linhas em {time.perf_counter() - inicio:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
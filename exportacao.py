@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+from processamento import formatar_exibicao, horas_float64, COLUNAS_TEMPO
+from instrumentacao import etapa
+
+logger = logging.getLogger(__name__)
+
+# ==================== EXPORTAÇÃO SOB DEMANDA ====================
+# Os arquivos são gerados só quando o botão de download é clicado, em blocos:
+# cada bloco é formatado (HH:MM:SS) e escrito, sem montar o arquivo inteiro em um DataFrame.
+LINHAS_POR_BLOCO = 100_000
+# Limite do Excel: 1.048.576 linhas por planilha, uma delas para o cabeçalho
+MAX_LINHAS_PLANILHA = 1_048_575
+# Medições (tempo/tamanho) das últimas exportações geradas, por (formato, chave do estado)
+MAX_MEDICOES = 32
+medicoes = OrderedDict()
+
+
+def chave_estado(*partes):
+    """Hash estável do estado ativo (filtros, origens, versão do armazém) para o cache das exportações"""
+    texto = json.dumps(partes, default=str, sort_keys=True)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _blocos(df, linhas_por_bloco, formatar_data):
+    for inicio in range(0, len(df), linhas_por_bloco):
+        yield formatar_exibicao(df.iloc[inicio:inicio + linhas_por_bloco], formatar_data=formatar_data)
+
+
+def exportar_excel(df, destino, linhas_por_bloco=LINHAS_POR_BLOCO, max_linhas_planilha=MAX_LINHAS_PLANILHA):
+    """
+    XLSX estilizado em modo `constant_memory` do xlsxwriter: cada linha é descarregada
+    no disco assim que escrita, então a memória não cresce com o número de linhas.
+    Nesse modo as linhas precisam ser escritas em ordem (cabeçalho primeiro).
+    Acima de `max_linhas_planilha` as linhas continuam em novas planilhas
+    (Dashboard, Dashboard (2), ...), cada uma com o próprio cabeçalho.
+    """
+    workbook = xlsxwriter.Workbook(destino, {"constant_memory": True, "default_date_format": "dd/mm/yyyy"})
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#764ba2', 'font_color': 'white', 'border': 1})
+    date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+    time_format = workbook.add_format({'num_format': 'hh:mm:ss'})
+    text_format = workbook.add_format({'num_format': '@'})  # Formato de texto para preservar zeros à esquerda
+    colunas = list(formatar_exibicao(df.iloc[:0]).columns)
+
+    def nova_planilha():
+        n = len(workbook.worksheets()) + 1
+        worksheet = workbook.add_worksheet("Dashboard" if n == 1 else f"Dashboard ({n})")
+        worksheet.set_column('A:A', 12, date_format)
+        worksheet.set_column('B:D', 25)
+        worksheet.set_column('E:E', 15, text_format)  # MRU como texto
+        worksheet.set_column('F:J', 15, time_format)
+        worksheet.write_row(0, 0, colunas, header_format)
+        return worksheet
+
+    worksheet = nova_planilha()
+    linha = 1
+    for bloco in _blocos(df, linhas_por_bloco, formatar_data=False):
+        # Nulos viram células vazias (o xlsxwriter não aceita NaN/NaT)
+        bloco = bloco.astype(object).where(bloco.notna(), None)
+        for valores in bloco.itertuples(index=False, name=None):
+            if linha > max_linhas_planilha:
+                worksheet = nova_planilha()
+                linha = 1
+            worksheet.write_row(linha, 0, valores)
+            linha += 1
+    workbook.close()
+
+
+def exportar_csv(df, destino, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """CSV (;) em UTF-8 com BOM, codificado bloco a bloco direto no destino binário"""
+    primeiro = True
+    for bloco in _blocos(df, linhas_por_bloco, formatar_data=True):
+        texto = bloco.to_csv(index=False, sep=';', header=primeiro)
+        destino.write(texto.encode('utf-8-sig' if primeiro else 'utf-8'))
+        primeiro = False
+    if primeiro:
+        destino.write(formatar_exibicao(df.iloc[:0]).to_csv(index=False, sep=';').encode('utf-8-sig'))
+
+
+def exportar_csv_gzip(df, destino, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """O mesmo CSV, comprimido em gzip à medida que os blocos são escritos"""
+    with gzip.GzipFile(fileobj=destino, mode="wb", compresslevel=6) as comprimido:
+        exportar_csv(df, comprimido, linhas_por_bloco)
+
+
+def exportar_parquet(df, destino, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """
+    Parquet tipado para uso em outras ferramentas: Data como data, dimensões como texto
+    e tempos em horas decimais (sem formatação HH:MM:SS). Um row group por bloco.
+    """
+    dimensoes = ["Colaborador", "Rota", "Regional", "MRU"]
+    schema = pa.schema(
+        [("Data", pa.date32())]
+        + [(coluna, pa.string()) for coluna in dimensoes]
+        + [(rotulo, pa.float64()) for rotulo in COLUNAS_TEMPO.values()]
+    )
+    with pq.ParquetWriter(destino, schema, compression="zstd") as escritor:
+        for inicio in range(0, len(df), linhas_por_bloco):
+            bloco = df.iloc[inicio:inicio + linhas_por_bloco]
+            saida = pd.DataFrame({"Data": bloco["Data"].dt.date})
+            for coluna in dimensoes:
+                saida[coluna] = bloco[coluna].astype("string")
+            for coluna, rotulo in COLUNAS_TEMPO.items():
+                saida[rotulo] = horas_float64(bloco[coluna])
+            escritor.write_table(pa.Table.from_pandas(saida, schema=schema, preserve_index=False))
+
+
+FORMATOS = {
+    "xlsx": {"gerar": exportar_excel, "extensao": "xlsx", "rotulo": "Excel",
+             "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "csv": {"gerar": exportar_csv, "extensao": "csv", "rotulo": "CSV", "mime": "text/csv"},
+    "csv.gz": {"gerar": exportar_csv_gzip, "extensao": "csv.gz", "rotulo": "CSV (gzip)", "mime": "application/gzip"},
+    "parquet": {"gerar": exportar_parquet, "extensao": "parquet", "rotulo": "Parquet",
+                "mime": "application/vnd.apache.parquet"},
+}
+
+
+def gerar_exportacao(formato, df, chave=None):
+    """
+    Gera o arquivo no formato pedido e mede tempo e tamanho.
+    Com `chave` (hash do estado dos filtros), a medição fica disponível em `medicoes`.
+    """
+    inicio = time.perf_counter()
+    with etapa("exportacao", formato=formato, linhas=len(df)) as medida:
+        destino = io.BytesIO()
+        FORMATOS[formato]["gerar"](df, destino)
+        conteudo = destino.getvalue()
+        medida["bytes"] = len(conteudo)
+    medicao = {"formato": formato, "linhas": len(df), "segundos": time.perf_counter() - inicio, "bytes": len(conteudo)}
+    logger.info("Exportação %s: %d linhas, %.2f s, %d bytes", formato, medicao["linhas"], medicao["segundos"], medicao["bytes"])
+    if chave is not None:
+        medicoes[(formato, chave)] = medicao
+        while len(medicoes) > MAX_MEDICOES:
+            medicoes.popitem(last=False)
+    return conteudo
@@ -0,0 +1,99 @@
+import pandas as pd
+import numpy as np
+
+from processamento import faixa_horas
+
+# ==================== ÍNDICE DOS FILTROS DA SIDEBAR ====================
+DIMENSOES_INDEXADAS = ["Colaborador", "Rota", "Regional", "MRU"]
+# Listas em cascata: opções de Colaborador/MRU disponíveis para as rotas selecionadas
+DIMENSOES_POR_ROTA = ["Colaborador", "MRU"]
+
+
+class IndiceFiltros:
+    """
+    Estruturas montadas UMA vez por dataset para compor os filtros sem reescanear as colunas:
+    - Datas: posições das linhas ordenadas por Data (busca binária do período)
+    - Dimensões: lista invertida (linhas de cada categoria) sobre os códigos do Categorical
+    - Cascata: pares (rota, colaborador) e (rota, MRU) existentes, para as listas de opções
+    A máscara final é a interseção (AND) dos conjuntos de linhas de cada filtro ativo.
+    """
+
+    def __init__(self, df):
+        self.n_linhas = len(df)
+        datas = df["Data"].to_numpy()
+        self._ordem_datas = np.argsort(datas, kind="stable")
+        self._datas_ordenadas = datas[self._ordem_datas]
+        self._faixas = faixa_horas(df["Horas_Liquidas"]).to_numpy()
+
+        self._categorias = {}
+        self._codigos = {}
+        self._linhas_por_codigo = {}
+        self._limites = {}
+        for dim in DIMENSOES_INDEXADAS:
+            categorico = df[dim].astype("category")
+            codigos = categorico.cat.codes.to_numpy()
+            self._categorias[dim] = categorico.cat.categories
+            self._codigos[dim] = codigos
+            # Deslocamento +1: o código -1 (nulo) vira o balde 0
+            self._linhas_por_codigo[dim] = np.argsort(codigos, kind="stable")
+            contagem = np.bincount(codigos + 1, minlength=len(categorico.cat.categories) + 1)
+            self._limites[dim] = np.concatenate([[0], np.cumsum(contagem)])
+
+        self._pares_rota = {}
+        codigos_rota = self._codigos["Rota"]
+        for dim in DIMENSOES_POR_ROTA:
+            codigos_dim = self._codigos[dim]
+            validos = (codigos_rota >= 0) & (codigos_dim >= 0)
+            largura = max(len(self._categorias[dim]), 1)
+            pares = np.unique(codigos_rota[validos].astype(np.int64) * largura + codigos_dim[validos])
+            self._pares_rota[dim] = (pares // largura, pares % largura)
+
+    def _linhas_categoria(self, dim, codigo):
+        limites = self._limites[dim]
+        return self._linhas_por_codigo[dim][limites[codigo + 1]:limites[codigo + 2]]
+
+    def _codigos_de(self, dim, valores):
+        codigos = self._categorias[dim].get_indexer(pd.Index(list(valores), dtype=object))
+        return codigos[codigos >= 0]
+
+    def _mascara_linhas(self, linhas):
+        mascara = np.zeros(self.n_linhas, dtype=bool)
+        mascara[linhas] = True
+        return mascara
+
+    def linhas_periodo(self, data_inicio, data_fim):
+        """Linhas com Data em [data_inicio, data_fim] (datas inclusivas) via busca binária"""
+        inicio = np.datetime64(pd.Timestamp(data_inicio))
+        fim = np.datetime64(pd.Timestamp(data_fim) + pd.Timedelta(days=1))
+        a, b = np.searchsorted(self._datas_ordenadas, [inicio, fim], side="left")
+        return self._ordem_datas[a:b]
+
+    def linhas_valores(self, dim, valores):
+        """Linhas cujo valor da dimensão está em `valores` (união das listas invertidas)"""
+        codigos = self._codigos_de(dim, valores)
+        if len(codigos) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self._linhas_categoria(dim, c) for c in codigos])
+
+    def mascara(self, filtros):
+        """Máscara booleana das linhas que atendem a todos os filtros (mesma estrutura de `filtros_vazios`)"""
+        mascara = self._mascara_linhas(self.linhas_periodo(filtros["data_inicio"], filtros["data_fim"]))
+        if filtros["colaborador"] is not None:
+            mascara &= self._mascara_linhas(self.linhas_valores("Colaborador", [filtros["colaborador"]]))
+        for dim, chave in (("Rota", "rotas"), ("Regional", "regionais"), ("MRU", "mrus")):
+            if filtros[chave] is not None:
+                mascara &= self._mascara_linhas(self.linhas_valores(dim, filtros[chave]))
+        if filtros["faixa"] is not None:
+            mascara &= self._faixas == filtros["faixa"]
+        return mascara
+
+    def opcoes(self, dim, rotas=None):
+        """Valores com registros na dimensão, em ordem; com `rotas`, só os que ocorrem nessas rotas"""
+        categorias = self._categorias[dim]
+        if rotas is None or dim not in self._pares_rota:
+            presentes = np.flatnonzero(np.diff(self._limites[dim])[1:])
+        else:
+            rota_dos_pares, codigo_dos_pares = self._pares_rota[dim]
+            selecionadas = self._codigos_de("Rota", rotas)
+            presentes = np.unique(codigo_dos_pares[np.isin(rota_dos_pares, selecionadas)])
+        return categorias[presentes].tolist()
@@ -0,0 +1,93 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# ==================== INSTRUMENTAÇÃO POR ETAPA ====================
+# Cada etapa medida (hash do upload, leitura, cache, preparar_dados, consultas, seções do
+# dashboard, exportações) gera uma linha de log JSON, agregável entre sessões e processos.
+# Quando há um coletor ativo (a sessão do dashboard), a medida também vai para o painel
+# de diagnóstico da sidebar. Com INSTRUMENTACAO_LOG, as linhas vão para esse arquivo (JSONL).
+INSTRUMENTACAO_ATIVA = os.environ.get("INSTRUMENTACAO", "1") != "0"
+INSTRUMENTACAO_LOG = os.environ.get("INSTRUMENTACAO_LOG")
+MAX_MEDIDAS_SESSAO = 200
+
+_coletor = contextvars.ContextVar("coletor_instrumentacao", default=None)
+_sessao = contextvars.ContextVar("sessao_instrumentacao", default=None)
+
+if INSTRUMENTACAO_LOG:
+    _handler = logging.FileHandler(INSTRUMENTACAO_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+def memoria_residente():
+    """Memória residente do processo em bytes (Linux: /proc/self/statm; None onde não houver)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def ativar_coleta(destino, sessao=None):
+    """
+    Direciona as medidas do contexto atual (a execução do script da sessão) para `destino`
+    (qualquer objeto com `append`, ex.: deque na session_state) e as identifica com `sessao`.
+    """
+    _coletor.set(destino)
+    _sessao.set(sessao)
+
+
+@contextmanager
+def etapa(nome, **atributos):
+    """
+    Mede tempo e variação da memória residente de um trecho. O dicionário devolvido pode ser
+    completado por quem mede (ex.: medida["cache"] = "hit", medida["linhas"] = len(df)).
+    """
+    medida = {"etapa": nome, **atributos}
+    if not INSTRUMENTACAO_ATIVA:
+        yield medida
+        return
+    rss_antes = memoria_residente()
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    except Exception as e:
+        medida["erro"] = type(e).__name__
+        raise
+    finally:
+        medida["segundos"] = round(time.perf_counter() - inicio, 4)
+        rss = memoria_residente()
+        if rss is not None and rss_antes is not None:
+            medida["rss_mb"] = round(rss / 1024 ** 2, 1)
+            medida["delta_mb"] = round((rss - rss_antes) / 1024 ** 2, 1)
+        medida["quando"] = round(time.time(), 3)
+        medida["pid"] = os.getpid()
+        sessao = _sessao.get()
+        if sessao is not None:
+            medida["sessao"] = sessao
+        destino = _coletor.get()
+        if destino is not None:
+            destino.append(medida)
+        logger.info(json.dumps(medida, ensure_ascii=False, default=str))
+
+
+def medido(nome, **atributos):
+    """Decorador: a função inteira como uma etapa (com `linhas` quando o retorno é um DataFrame)"""
+    def decorador(func):
+        @functools.wraps(func)
+        def executar(*args, **kwargs):
+            with etapa(nome, **atributos) as medida:
+                resultado = func(*args, **kwargs)
+                if hasattr(resultado, "columns"):
+                    medida["linhas"] = len(resultado)
+                return resultado
+        return executar
+    return decorador
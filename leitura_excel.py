@@ -1,105 +1,511 @@
 import pandas as pd
 import numpy as np
-import duckdb
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import csv
 import os
+import time
 import hashlib
+import tempfile
+import threading
+import logging
+
+from processamento import (
+    preparar_dados_paralelo, converter_horas, nova_contagem_horas,
+    VERSAO_PROCESSAMENTO, N_INTERVALOS, COLUNAS_HORARIO,
+)
+from instrumentacao import etapa
+
+logger = logging.getLogger(__name__)
+
+try:
+    import xxhash
+except ImportError:  # xxhash é opcional; blake2b (stdlib) é o fallback
+    xxhash = None
+
+# ==================== LAYOUT E REGRAS DE LIMPEZA ====================
+INDICES_FIXOS = [0, 3, 4, 12, 36, 41, 46]
+NOMES_SISTEMA = [
+    "Data", "Rota", "Regional", "MRU",
+    "Horas_Input", "Colaborador", "Intervalos_Input"
+]
+MRU_DIGITOS = 8
+
+# Incrementar sempre que a lógica de limpeza mudar sem alterar as constantes acima
+REVISAO_LIMPEZA = 6
+
+# ==================== CACHE PARQUET ====================
+CACHE_DIR = ".cache_parquet"
+CACHE_MAX_MB = int(os.environ.get("CACHE_PARQUET_MAX_MB", "2048"))
+CACHE_MAX_DIAS = int(os.environ.get("CACHE_PARQUET_MAX_DIAS", "30"))
+HASH_CHUNK = 1024 * 1024
+
+# ==================== LEITURA XLSX EM STREAMING ====================
+# Planilhas acima deste tamanho são lidas linha a linha: a leitura (células do openpyxl) ocupa
+# só um lote por vez; o frame das 7 colunas tipadas é montado inteiro ao fim, para o processamento
+XLSX_STREAMING_MB = int(os.environ.get("XLSX_STREAMING_MB", "100"))
+LINHAS_POR_LOTE = 100_000
+
+
+def _novo_hasher():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def versao_regras(*partes):
+    """Carimbo curto das regras de limpeza; muda quando qualquer regra muda"""
+    base = repr((INDICES_FIXOS, NOMES_SISTEMA, MRU_DIGITOS, REVISAO_LIMPEZA) + partes)
+    return hashlib.md5(base.encode("utf-8")).hexdigest()[:8]
+
 
 def get_file_hash(arquivo):
-    """Gera um hash único baseado no conteúdo do arquivo para o cache"""
-    try:
-        # Pega os primeiros e últimos 8kb para velocidade
+    """
+    Gera um hash do conteúdo COMPLETO do arquivo, lido em blocos (streaming).
+    Erros de leitura propagam: o hash identifica o arquivo no cache e no armazém, e um
+    valor de reserva faria arquivos diferentes colidirem.
+    """
+    with etapa("hash_arquivo") as medida:
+        hasher = _novo_hasher()
         arquivo.seek(0)
-        prefix = arquivo.read(8192)
-        arquivo.seek(0, os.SEEK_END)
-        suffix = arquivo.read(8192)
+        tamanho = 0
+        while True:
+            bloco = arquivo.read(HASH_CHUNK)
+            if not bloco:
+                break
+            hasher.update(bloco)
+            tamanho += len(bloco)
         arquivo.seek(0)
-        return hashlib.md5(prefix + suffix).hexdigest()
-    except:
+        medida["bytes"] = tamanho
+        return hasher.hexdigest()
+
+
+def caminho_cache(file_hash, sufixo="", cache_dir=CACHE_DIR):
+    """Caminho do Parquet no cache: hash do conteúdo + versão das regras de limpeza"""
+    if not file_hash:
         return None
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{file_hash}_{versao_regras()}{sufixo}.parquet")
+
 
-def carregar_dados(arquivo):
+def limpar_cache(cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB, max_dias=CACHE_MAX_DIAS):
     """
-    Carregamento com CACHE PARQUET:
-    1. Verifica se já existe uma versão processada (Parquet) do arquivo.
-    2. Se existir, carrega em < 0.1s.
-    3. Se não, processa via DuckDB/Calamine e salva o Parquet para a próxima vez.
+    Política de despejo do cache:
+    1. Remove entradas não acessadas há mais de `max_dias`.
+    2. Se o diretório ainda passar de `max_mb`, remove as menos usadas (LRU por mtime).
     """
-    # Criar pasta de cache se não existir
-    cache_dir = ".cache_parquet"
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
+    try:
+        entradas = []
+        for nome in os.listdir(cache_dir):
+            caminho = os.path.join(cache_dir, nome)
+            if os.path.isfile(caminho):
+                st_info = os.stat(caminho)
+                entradas.append((st_info.st_mtime, st_info.st_size, caminho))
+    except OSError:
+        return
 
-    file_hash = get_file_hash(arquivo)
-    parquet_path = os.path.join(cache_dir, f"{file_hash}.parquet") if file_hash else None
+    limite_idade = time.time() - max_dias * 86400
+    restantes = []
+    for mtime, tamanho, caminho in entradas:
+        if mtime < limite_idade:
+            try: os.remove(caminho)
+            except OSError: pass
+        else:
+            restantes.append((mtime, tamanho, caminho))
 
-    # TENTATIVA 1: Carregar do Cache Parquet (Instantâneo)
-    if parquet_path and os.path.exists(parquet_path):
+    total = sum(tamanho for _, tamanho, _ in restantes)
+    limite_bytes = max_mb * 1024 * 1024
+    for mtime, tamanho, caminho in sorted(restantes):
+        if total <= limite_bytes:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
+
+
+def ler_cache(caminho):
+    """Lê um Parquet do cache e renova o mtime (marca como usado recentemente)"""
+    if caminho and os.path.exists(caminho):
         try:
-            return pd.read_parquet(parquet_path)
+            df = pd.read_parquet(caminho)
+            try: os.utime(caminho, None)
+            except OSError: pass
+            return df
         except:
             pass # Se o cache estiver corrompido, segue para o carregamento normal
+    return None
 
-    # TENTATIVA 2: Carregamento Normal (DuckDB ou Excel)
-    indices_fixos = [0, 3, 4, 12, 36, 41, 46]
-    nomes_sistema = [
-        "Data", "Rota", "Regional", "MRU", 
-        "Horas_Input", "Colaborador", "Intervalos_Input"
-    ]
-    
+
+def _sufixo_temporario():
+    """Sufixo único por processo/thread (sessões Streamlit compartilham o mesmo processo)"""
+    return f"{os.getpid()}_{threading.get_ident()}"
+
+
+def salvar_cache(df, caminho, cache_dir=CACHE_DIR):
+    """Grava o Parquet de forma atômica e aplica a política de despejo"""
+    if not caminho:
+        return
+    try:
+        temp_path = f"{caminho}.{_sufixo_temporario()}.tmp"
+        df.to_parquet(temp_path, compression='snappy')
+        os.replace(temp_path, caminho)
+    except Exception as e:
+        # Sem cache o dashboard segue funcionando (só reprocessa na próxima vez)
+        logger.warning("Falha ao gravar o cache %s (%s: %s)", caminho, type(e).__name__, e)
+        try: os.remove(temp_path)
+        except OSError: pass
+        return
+    limpar_cache(cache_dir)
+
+
+def _buffer_arrow(arquivo):
+    """Buffer Arrow sobre o conteúdo do upload; sem cópia quando o objeto expõe getbuffer()"""
+    if hasattr(arquivo, "getbuffer"):
+        return pa.py_buffer(arquivo.getbuffer())
+    arquivo.seek(0)
+    return pa.py_buffer(arquivo.read())
+
+
+def _detectar_delimitador(buffer):
+    amostra = buffer.slice(0, min(buffer.size, 65536)).to_pybytes().decode("utf-8", errors="ignore")
+    try:
+        return csv.Sniffer().sniff(amostra, delimiters=";,\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def ler_csv(arquivo):
+    """
+    Leitura de CSV direto da memória (PyArrow), sem arquivo temporário:
+    - Projeção: só as 7 colunas de INDICES_FIXOS são convertidas
+    - Tipos explícitos: tudo como texto (preserva zeros da MRU); Data/Horas são
+      convertidas depois, de forma vetorizada
+    - Encoding: UTF-8 (com ou sem BOM); se falhar, Latin-1 (exportações do Windows)
+    """
+    buffer = _buffer_arrow(arquivo)
+    colunas = [f"f{i}" for i in INDICES_FIXOS]
+    parse_options = pa_csv.ParseOptions(delimiter=_detectar_delimitador(buffer))
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=colunas,
+        include_missing_columns=True,
+        column_types={c: pa.string() for c in colunas},
+        strings_can_be_null=True,
+        null_values=[""],
+    )
+
+    for encoding in ("utf8", "latin1"):
+        read_options = pa_csv.ReadOptions(
+            autogenerate_column_names=True, skip_rows=1, encoding=encoding
+        )
+        try:
+            tabela = pa_csv.read_csv(
+                pa.BufferReader(buffer),
+                read_options=read_options,
+                parse_options=parse_options,
+                convert_options=convert_options,
+            )
+            break
+        except (pa.ArrowInvalid, UnicodeDecodeError):
+            if encoding == "latin1":
+                raise
+
+    df = tabela.to_pandas()
+    df.columns = NOMES_SISTEMA
+    df["Data"] = _converter_datas(df["Data"])
+    return df
+
+
+def _converter_datas(valores):
+    """Datas em texto: ISO (aaaa-mm-dd) e, para o que sobrar, o padrão brasileiro dd/mm/aaaa"""
+    datas = pd.to_datetime(valores, format="ISO8601", errors="coerce")
+    for formato in ("%d/%m/%Y", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M"):
+        pendentes = datas.isna() & valores.notna()
+        if not pendentes.any():
+            break
+        datas[pendentes] = pd.to_datetime(valores[pendentes], format=formato, errors="coerce")
+    return datas
+
+
+def _tamanho_arquivo(arquivo):
+    if hasattr(arquivo, "getbuffer"):
+        return arquivo.getbuffer().nbytes
+    posicao = arquivo.tell()
+    arquivo.seek(0, os.SEEK_END)
+    tamanho = arquivo.tell()
+    arquivo.seek(posicao)
+    return tamanho
+
+
+def converter_horarios(df, contagem=None):
+    """
+    Substitui Horas_Input/Intervalos_Input pelas colunas em horas decimais
+    (Hora_Decimal/Intervalo_Decimal) usando o tipo nativo de cada célula.
+    `contagem` acumula, por coluna, quantas células seguiram cada caminho.
+    """
+    if contagem is None:
+        contagem = {}
+    for bruta, decimal in COLUNAS_HORARIO.items():
+        if bruta not in df.columns:
+            continue
+        horas, parcial = converter_horas(df[bruta])
+        total = contagem.setdefault(bruta, nova_contagem_horas())
+        for caminho, quantidade in parcial.items():
+            total[caminho] += quantidade
+        df.insert(df.columns.get_loc(bruta), decimal, horas)
+        del df[bruta]
+    return contagem
+
+
+def _registrar_contagem(df, contagem):
+    df.attrs["conversao_horarios"] = contagem
+    logger.info("Conversão de horários por tipo de célula: %s", contagem)
+
+
+def _texto_celula(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))  # 100.0 (coluna numérica com vazios) -> "100", como a célula inteira
+    return str(valor)
+
+
+def dimensoes_texto(df, colunas=("Rota", "Regional", "MRU", "Colaborador")):
+    """
+    Células de dimensão como texto (nulos preservados), iguais nos dois leitores de XLSX:
+    o Calamine devolve números como int/float e o streaming (openpyxl) célula a célula.
+    A conversão é feita nos valores distintos, não linha a linha. Altera `df`.
+    """
+    for coluna in colunas:
+        if coluna not in df.columns:
+            continue
+        codigos, distintos = pd.factorize(df[coluna], use_na_sentinel=True)
+        textos = np.array([_texto_celula(v) for v in distintos] + [None], dtype=object)
+        df[coluna] = textos[codigos]  # código -1 (nulo) pega o None do fim
+    return df
+
+
+def _schema_streaming():
+    campos = [("Data", pa.timestamp("us"))]
+    for nome in NOMES_SISTEMA[1:]:
+        if nome in COLUNAS_HORARIO:
+            campos.append((COLUNAS_HORARIO[nome], pa.float64()))
+        else:
+            campos.append((nome, pa.string()))
+    return pa.schema(campos)
+
+
+def _lote_para_arrow(linhas, schema, contagem):
+    """Converte um lote de tuplas (7 colunas projetadas) em RecordBatch com schema fixo"""
+    lote = pd.DataFrame(linhas, columns=NOMES_SISTEMA, dtype=object)
+    eh_texto = lote["Data"].map(lambda v: isinstance(v, str))
+    datas = pd.to_datetime(lote["Data"].where(~eh_texto), errors="coerce")
+    if eh_texto.any():
+        datas[eh_texto] = _converter_datas(lote.loc[eh_texto, "Data"])
+    lote["Data"] = datas
+    converter_horarios(lote, contagem)
+    dimensoes_texto(lote)
+    return pa.RecordBatch.from_pandas(lote, schema=schema, preserve_index=False)
+
+
+def ler_excel_streaming(arquivo, destino, progresso=None, linhas_por_lote=LINHAS_POR_LOTE, contagem=None):
+    """
+    Leitura de XLSX grande em STREAMING (openpyxl read_only):
+    1. Percorre as linhas sem carregar a planilha inteira em memória.
+    2. Projeta só as 7 colunas de INDICES_FIXOS.
+    3. Converte os horários de cada lote para horas decimais (`converter_horarios`).
+    4. Grava cada lote como RecordBatch em `destino` (Parquet temporário de staging, não o
+       cache: quem chama lê o arquivo inteiro de volta e o cache é gravado após a limpeza).
+    Só a leitura fica limitada a `linhas_por_lote`; o pico de memória é o do frame final
+    das 7 colunas, sem os objetos de célula da planilha inteira.
+    `progresso(linhas_lidas, total_estimado)` é chamado a cada lote.
+    """
+    if contagem is None:
+        contagem = {}
+    from openpyxl import load_workbook
+
+    arquivo.seek(0)
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        planilha = workbook.worksheets[0]
+        total_estimado = max((planilha.max_row or 1) - 1, 1)
+        ultima_coluna = max(INDICES_FIXOS) + 1
+
+        schema = _schema_streaming()
+        linhas_lidas = 0
+        lote = []
+        with pq.ParquetWriter(destino, schema, compression="snappy") as writer:
+            for linha in planilha.iter_rows(min_row=2, max_col=ultima_coluna, values_only=True):
+                if len(linha) < ultima_coluna:
+                    linha = linha + (None,) * (ultima_coluna - len(linha))
+                lote.append(tuple(linha[i] for i in INDICES_FIXOS))
+                if len(lote) >= linhas_por_lote:
+                    writer.write_batch(_lote_para_arrow(lote, schema, contagem))
+                    linhas_lidas += len(lote)
+                    lote = []
+                    if progresso:
+                        progresso(linhas_lidas, max(total_estimado, linhas_lidas))
+            if lote:
+                writer.write_batch(_lote_para_arrow(lote, schema, contagem))
+                linhas_lidas += len(lote)
+        if progresso:
+            progresso(linhas_lidas, linhas_lidas)
+    finally:
+        workbook.close()
+    return destino
+
+
+def ler_excel(arquivo, destino_temporario, progresso=None, contagem=None):
+    """
+    Escolhe entre leitura completa (Calamine) e streaming conforme o tamanho do arquivo.
+    No streaming os horários já voltam convertidos (contabilizados em `contagem`).
+    Se o openpyxl falhar no streaming, o arquivo é lido pelo caminho completo.
+    """
+    if _tamanho_arquivo(arquivo) >= XLSX_STREAMING_MB * 1024 * 1024:
+        try:
+            ler_excel_streaming(arquivo, destino_temporario, progresso=progresso, contagem=contagem)
+            return pd.read_parquet(destino_temporario)
+        except Exception as e:
+            logger.warning("Leitura em streaming falhou (%s: %s); usando a leitura completa", type(e).__name__, e)
+            if contagem is not None:
+                contagem.clear()  # horários do streaming parcial não entram na contagem
+        finally:
+            try: os.remove(destino_temporario)
+            except OSError: pass
+        arquivo.seek(0)
+
+    try:
+        df = pd.read_excel(arquivo, usecols=INDICES_FIXOS, header=0, engine='calamine')
+    except:
+        try:
+            df = pd.read_excel(arquivo, usecols=INDICES_FIXOS, header=0, engine='openpyxl')
+        except:
+            df = pd.read_excel(arquivo, header=0)
+            df = df.iloc[:, [i for i in INDICES_FIXOS if i < len(df.columns)]]
+
+    if len(df.columns) == len(NOMES_SISTEMA):
+        df.columns = NOMES_SISTEMA
+    else:
+        novos_nomes = {col: NOMES_SISTEMA[i] for i, col in enumerate(df.columns) if i < len(NOMES_SISTEMA)}
+        df.rename(columns=novos_nomes, inplace=True)
+    # Mesmos tipos do streaming: Rota/Regional/MRU/Colaborador numéricos viram texto
+    return dimensoes_texto(df)
+
+
+def limpar_mru(valores):
+    """Normaliza o código MRU: remove '.0', descarta o sufixo após '-' e completa com zeros"""
+    valores = valores.str.replace(r"\.0$", "", regex=True)
+    return valores.str.split("-").str[0].str.strip().str.zfill(MRU_DIGITOS)
+
+
+def categorizar(serie, limpar=None, valor_nulo=None):
+    """
+    Converte uma coluna em Categorical e aplica a limpeza de texto apenas
+    nas categorias distintas (milhares) em vez de em cada linha (milhões).
+    - `limpar`: função Series[str] -> Series[str] aplicada às categorias
+    - `valor_nulo`: texto usado no lugar de células vazias (None mantém NaN)
+    As categorias finais ficam ordenadas, então ordenações e listas de filtro
+    seguem a ordem alfabética.
+    """
+    cat = serie.astype("category")
+    if valor_nulo is not None and cat.isna().any():
+        if valor_nulo not in cat.cat.categories:
+            cat = cat.cat.add_categories([valor_nulo])
+        cat = cat.fillna(valor_nulo)
+    if limpar is None:
+        return cat
+
+    categorias = limpar(pd.Series(cat.cat.categories.astype(str)))
+
+    novas = pd.Index(categorias.unique()).sort_values()
+    mapa = np.append(novas.get_indexer(categorias), -1)  # código -1 (NaN) continua -1
+    return pd.Categorical.from_codes(mapa[cat.cat.codes.to_numpy()], categories=novas)
+
+
+def carregar_dados(arquivo, file_hash=None, progresso=None):
+    """
+    Carregamento com CACHE PARQUET:
+    1. Verifica se já existe uma versão processada (Parquet) do arquivo.
+    2. Se existir, carrega em < 0.1s.
+    3. Se não, processa via PyArrow (CSV) / Calamine (Excel) e salva o Parquet para a próxima vez.
+       XLSX grandes (>= XLSX_STREAMING_MB) são lidos em streaming; `progresso` recebe o andamento.
+    """
+    if file_hash is None:
+        file_hash = get_file_hash(arquivo)
+    parquet_path = caminho_cache(file_hash)
+
+    # TENTATIVA 1: Carregar do Cache Parquet (Instantâneo)
+    with etapa("cache_bruto") as medida:
+        df = ler_cache(parquet_path)
+        medida["cache"] = "miss" if df is None else "hit"
+        if df is not None:
+            medida["linhas"] = len(df)
+    if df is not None:
+        return df
+
+    # TENTATIVA 2: Carregamento Normal (PyArrow ou Excel)
+    contagem = {}
     nome_arquivo = getattr(arquivo, 'name', '').lower()
     
     if nome_arquivo.endswith('.csv'):
-        try:
-            temp_path = f"temp_{os.getpid()}.csv"
-            with open(temp_path, "wb") as f:
-                f.write(arquivo.getbuffer())
-            
-            con = duckdb.connect(database=':memory:')
-            query = f"""
-                SELECT 
-                    column{indices_fixos[0]} as Data,
-                    column{indices_fixos[1]} as Rota,
-                    column{indices_fixos[2]} as Regional,
-                    column{indices_fixos[3]} as MRU,
-                    column{indices_fixos[4]} as Horas_Input,
-                    column{indices_fixos[5]} as Colaborador,
-                    column{indices_fixos[6]} as Intervalos_Input
-                FROM read_csv_auto('{temp_path}', header=True)
-            """
-            df = con.execute(query).df()
-            try: os.remove(temp_path)
-            except: pass
-        except:
-            arquivo.seek(0)
-            df = pd.read_csv(arquivo, usecols=indices_fixos, sep=None, engine='python', encoding='utf-8-sig')
-            df.columns = nomes_sistema
+        with etapa("leitura_csv", bytes=_tamanho_arquivo(arquivo)) as medida:
+            df = ler_csv(arquivo)
+            medida["linhas"] = len(df)
     else:
-        try:
-            df = pd.read_excel(arquivo, usecols=indices_fixos, header=0, engine='calamine')
-        except:
-            try:
-                df = pd.read_excel(arquivo, usecols=indices_fixos, header=0, engine='openpyxl')
-            except:
-                df = pd.read_excel(arquivo, header=0)
-                df = df.iloc[:, [i for i in indices_fixos if i < len(df.columns)]]
-
-        if len(df.columns) == len(nomes_sistema):
-            df.columns = nomes_sistema
-        else:
-            novos_nomes = {col: nomes_sistema[i] for i, col in enumerate(df.columns) if i < len(nomes_sistema)}
-            df.rename(columns=novos_nomes, inplace=True)
+        base = parquet_path or os.path.join(tempfile.gettempdir(), "dashboard_xlsx")
+        destino_temporario = f"{base}.{_sufixo_temporario()}.stream.tmp"
+        with etapa("leitura_excel", bytes=_tamanho_arquivo(arquivo)) as medida:
+            df = ler_excel(arquivo, destino_temporario, progresso=progresso, contagem=contagem)
+            medida["linhas"] = len(df)
 
-    # Limpezas básicas
-    df["Colaborador"] = df["Colaborador"].fillna("Não Identificado").astype(str).str.strip()
+    # Horários -> horas decimais pelo tipo nativo da célula (sem astype(str) + reparse)
+    with etapa("converter_horarios", linhas=len(df)) as medida:
+        converter_horarios(df, contagem)
+        medida["caminhos"] = contagem
+    _registrar_contagem(df, contagem)
+
+    # Limpezas básicas (feitas sobre as categorias, não linha a linha)
+    df["Colaborador"] = categorizar(df["Colaborador"], limpar=lambda v: v.str.strip(), valor_nulo="Não Identificado")
     if "MRU" in df.columns:
-        df["MRU"] = df["MRU"].astype(str).str.replace(r"\.0$", "", regex=True)
-        df["MRU"] = df["MRU"].str.split("-").str[0].str.strip().str.zfill(8)
+        df["MRU"] = categorizar(df["MRU"], limpar=limpar_mru)
+    # Rota/Regional sempre como texto: partes de arquivos diferentes (CSV, XLSX com células
+    # numéricas) precisam das mesmas categorias ao serem unidas no armazém
+    for coluna in ["Rota", "Regional"]:
+        if coluna in df.columns:
+            df[coluna] = categorizar(df[coluna], limpar=lambda v: v.str.strip())
 
     # SALVAR NO CACHE PARA A PRÓXIMA VEZ
-    if parquet_path:
-        try:
-            df.to_parquet(parquet_path, compression='snappy')
-        except:
-            pass
+    with etapa("salvar_cache", linhas=len(df)):
+        salvar_cache(df, parquet_path)
 
     return df
+
+
+def carregar_processado(arquivo, n_intervalos=N_INTERVALOS, progresso=None, file_hash=None, processos=None):
+    """
+    Cache em DOIS NÍVEIS:
+    1. Resultado de `preparar_dados` (agregado por Colaborador/dia) -> retorno direto.
+    2. Leitura bruta das 7 colunas -> só reexecuta `preparar_dados`.
+    A chave do nível 1 inclui a versão do processamento, então mudanças na
+    agregação invalidam apenas esse nível.
+    Arquivos grandes usam `preparar_dados_paralelo` (`processos=1` força o serial).
+    """
+    if file_hash is None:
+        file_hash = get_file_hash(arquivo)
+    parquet_proc = caminho_cache(file_hash, sufixo=f"_proc{VERSAO_PROCESSAMENTO}n{n_intervalos}")
+
+    with etapa("cache_processado") as medida:
+        df_proc = ler_cache(parquet_proc)
+        medida["cache"] = "miss" if df_proc is None else "hit"
+        if df_proc is not None:
+            medida["linhas"] = len(df_proc)
+    if df_proc is not None:
+        return df_proc
+
+    df_raw = carregar_dados(arquivo, file_hash=file_hash, progresso=progresso)
+    df_proc = preparar_dados_paralelo(df_raw, n_intervalos=n_intervalos, processos=processos)
+
+    with etapa("salvar_cache", linhas=len(df_proc)):
+        salvar_cache(df_proc, parquet_proc)
+    return df_proc
@@ -0,0 +1,123 @@
+"""
+Pré-processamento em lote, sem Streamlit: varre um diretório de exportações (XLSX/CSV),
+processa os arquivos em paralelo e grava tudo no cache/armazém que o dashboard lê.
+Pensado para rodar de madrugada (cron) e deixar o dashboard "quente" para os supervisores.
+
+Uso (a partir do diretório do app, onde ficam .cache_parquet/ e .armazem_parquet/):
+    python precalcular.py /caminho/das/exportacoes [--processos 4] [--recursivo]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from leitura_excel import carregar_processado, get_file_hash
+from armazenamento import ARMAZEM_DIR, importar_arquivo, ler_manifesto
+
+EXTENSOES = (".xlsx", ".csv")
+
+
+def listar_arquivos(diretorio, recursivo=False):
+    """Exportações do diretório em ordem de nome (a mesma ordem de importação do app)"""
+    encontrados = []
+    for raiz, pastas, nomes in os.walk(diretorio):
+        encontrados += [os.path.join(raiz, n) for n in nomes if n.lower().endswith(EXTENSOES) and not n.startswith("~$")]
+        if not recursivo:
+            break
+    return sorted(encontrados, key=lambda c: (os.path.basename(c), c))
+
+
+def hash_arquivo(caminho):
+    with open(caminho, "rb") as arquivo:
+        return get_file_hash(arquivo)
+
+
+def processar(caminho, file_hash):
+    """
+    Executado em um processo do pool: leitura + `preparar_dados` de UM arquivo.
+    O resultado fica nos dois níveis do cache Parquet; o retorno é só (linhas, segundos).
+    O paralelismo já é entre arquivos, então `preparar_dados` roda serial aqui.
+    """
+    inicio = time.perf_counter()
+    with open(caminho, "rb") as arquivo:
+        df = carregar_processado(arquivo, file_hash=file_hash, processos=1)
+    return len(df), time.perf_counter() - inicio
+
+
+def _mb(n_bytes):
+    return n_bytes / 1024 ** 2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-processa exportações XLSX/CSV para o cache do dashboard.")
+    parser.add_argument("diretorio", help="Diretório com as exportações")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="Processos em paralelo (padrão: nº de núcleos)")
+    parser.add_argument("--recursivo", action="store_true", help="Inclui subdiretórios")
+    parser.add_argument("--armazem", default=ARMAZEM_DIR, help=f"Diretório do armazém (padrão: {ARMAZEM_DIR})")
+    args = parser.parse_args(argv)
+
+    inicio_total = time.perf_counter()
+    arquivos = listar_arquivos(args.diretorio, args.recursivo)
+    if not arquivos:
+        print(f"Nenhum arquivo {'/'.join(EXTENSOES)} em {args.diretorio}")
+        return 1
+
+    # 1. Hash do conteúdo: arquivos já importados no armazém são pulados
+    manifesto = ler_manifesto(args.armazem)
+    pendentes, existentes, falhas = [], 0, 0
+    for caminho in arquivos:
+        try:
+            file_hash = hash_arquivo(caminho)
+        except OSError as e:
+            falhas += 1
+            print(f"[erro]  {caminho}: {e}")
+            continue
+        if file_hash in manifesto["arquivos"]:
+            existentes += 1
+            print(f"[ok]    {caminho} (já no armazém)")
+        else:
+            pendentes.append((caminho, file_hash))
+    if not pendentes:
+        print("Nada a fazer.")
+        return 1 if falhas else 0
+
+    # 2. Leitura + preparar_dados em paralelo (cada processo grava o cache do seu arquivo)
+    print(f"Processando {len(pendentes)} arquivo(s) com {args.processos} processo(s)...")
+    processados = []
+    with ProcessPoolExecutor(max_workers=args.processos) as pool:
+        futuros = {pool.submit(processar, caminho, file_hash): (caminho, file_hash) for caminho, file_hash in pendentes}
+        for futuro in as_completed(futuros):
+            caminho, file_hash = futuros[futuro]
+            try:
+                linhas, segundos = futuro.result()
+            except Exception as e:
+                falhas += 1
+                print(f"[erro]  {caminho}: {e}")
+                continue
+            tamanho = os.path.getsize(caminho)
+            print(
+                f"[proc]  {caminho}: {linhas:,} linhas em {segundos:.2f} s "
+                f"({_mb(tamanho) / max(segundos, 1e-9):.1f} MB/s, {linhas / max(segundos, 1e-9):,.0f} linhas/s)"
+            )
+            processados.append((caminho, file_hash))
+
+    # 3. Importação no armazém em série e na ordem dos nomes (manifesto, duplicidade e cubos);
+    #    o processamento já está no cache, então aqui só há leitura do Parquet e gravação das partes
+    for caminho, file_hash in sorted(processados, key=lambda p: arquivos.index(p[0])):
+        inicio = time.perf_counter()
+        with open(caminho, "rb") as arquivo:
+            importar_arquivo(arquivo, base=args.armazem, file_hash=file_hash)
+        print(f"[arm]   {caminho}: importado em {time.perf_counter() - inicio:.2f} s")
+
+    total = time.perf_counter() - inicio_total
+    volume = sum(os.path.getsize(c) for c, _ in processados)
+    print(
+        f"Concluído: {len(processados)} processado(s), {falhas} falha(s), "
+        f"{existentes} já existente(s) em {total:.2f} s ({_mb(volume) / max(total, 1e-9):.1f} MB/s)"
+    )
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
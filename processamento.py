@@ -1,5 +1,34 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import datetime as dt
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentacao import etapa, medido
+
+# Modo compacto do dataset processado: horas em float32 (erro < 0,01 s em jornadas de até 24h,
+# abaixo da resolução exibida) e dimensões como Categorical. Somas, médias e totais são
+# calculados em float64 (DuckDB/cubo); DADOS_COMPACTOS=0 mantém tudo em float64.
+DADOS_COMPACTOS = os.environ.get("DADOS_COMPACTOS", "1") != "0"
+TIPO_HORAS = np.float32 if DADOS_COMPACTOS else np.float64
+
+# Incrementar sempre que a saída de `preparar_dados` mudar (invalida o cache processado);
+# o sufixo "c" separa os caches do modo compacto
+VERSAO_PROCESSAMENTO = "4c" if DADOS_COMPACTOS else "4"
+
+# Quantidade de maiores intervalos descontados da jornada diária
+N_INTERVALOS = 3
+
+# Modo paralelo de `preparar_dados`: abaixo deste número de linhas brutas o caminho serial
+# é mais rápido (criar os processos custa ~1 s); PARALELO_PROCESSOS=1 desliga o modo
+PARALELO_MIN_LINHAS = int(os.environ.get("PARALELO_MIN_LINHAS", 2_000_000))
+PARALELO_PROCESSOS = int(os.environ.get("PARALELO_PROCESSOS", os.cpu_count() or 1))
+
+# Faixas do Perfil de Produtividade (mesma regra do pd.cut: (inferior, superior])
+LIMITES_FAIXAS = [0, 8, 9, 10, 11, 12, 100]
+ROTULOS_FAIXAS = ['Até 08:00:00', 'Até 09:00:00', 'Até 10:00:00', 'Até 11:00:00', 'Até 12:00:00', 'Acima de 12:00:00']
 
 def horas_para_tempo(horas, incluir_segundos=True):
     """Converte horas decimais para formato de tempo (HH:MM:SS) - Versão otimizada"""
@@ -24,28 +53,205 @@ def horas_para_tempo(horas, incluir_segundos=True):
         return f"{sinal}{h:02d}:{m:02d}:{s:02d}"
     return f"{sinal}{h:02d}:{m:02d}"
 
-def preparar_dados(df):
+def _partes_horas(valores):
+    """(h, m, s) inteiros do valor absoluto + máscaras de negativos e nulos (mesma aritmética da versão escalar)"""
+    horas = np.asarray(valores, dtype=np.float64)
+    nulos = ~np.isfinite(horas)
+    horas = np.where(nulos, 0.0, horas)
+    negativos = horas < 0
+    horas_abs = np.abs(horas)
+
+    h = np.trunc(horas_abs)
+    resto_min = (horas_abs - h) * 60
+    m = np.trunc(resto_min)
+    s = np.round((resto_min - m) * 60)  # round() do Python e do NumPy arredondam meio-para-par
+
+    h = h.astype(np.int64)
+    m = m.astype(np.int64)
+    s = s.astype(np.int64)
+
+    # Vai-um: 60s -> +1min, 60min -> +1h
+    vai_min = s == 60
+    s[vai_min] = 0
+    m[vai_min] += 1
+    vai_hora = m == 60
+    m[vai_hora] = 0
+    h[vai_hora] += 1
+    return h, m, s, negativos, nulos
+
+def _formatar_horas_array(valores, incluir_segundos=True):
+    """Núcleo NumPy de `horas_para_tempo_vetorizado`"""
+    h, m, s, negativos, nulos = _partes_horas(valores)
+
+    # Montagem em um único passo: buffer de bytes "HH:MM:SS" (ASCII) visto como strings fixas
+    largura = 8 if incluir_segundos else 5
+    buffer = np.empty((h.size, largura), dtype=np.uint8)
+    buffer[:, 0] = 48 + (h // 10) % 10
+    buffer[:, 1] = 48 + h % 10
+    buffer[:, 2] = 58  # ":"
+    buffer[:, 3] = 48 + m // 10
+    buffer[:, 4] = 48 + m % 10
+    if incluir_segundos:
+        buffer[:, 5] = 58
+        buffer[:, 6] = 48 + s // 10
+        buffer[:, 7] = 48 + s % 10
+    texto = buffer.view(f"S{largura}").ravel().astype(f"U{largura}").astype(object)
+
+    # Casos raros tratados à parte: jornadas com 3+ dígitos de hora e valores negativos
+    longas = h >= 100
+    if longas.any():
+        texto[longas] = [f"{hh}{tt[2:]}" for hh, tt in zip(h[longas], texto[longas])]
+    if negativos.any():
+        texto[negativos] = "-" + texto[negativos]
+    texto[nulos] = "00:00:00" if incluir_segundos else "00:00"
+    return texto
+
+def horas_para_tempo_vetorizado(valores, incluir_segundos=True):
+    """
+    Versão vetorizada de `horas_para_tempo` para Series, DataFrames e arrays.
+    Produz exatamente as mesmas strings da versão escalar (incluindo negativos e NaN).
+    """
+    if isinstance(valores, pd.DataFrame):
+        return valores.apply(lambda col: horas_para_tempo_vetorizado(col, incluir_segundos))
+    if isinstance(valores, pd.Series):
+        texto = _formatar_horas_array(valores.to_numpy(dtype=np.float64, na_value=np.nan), incluir_segundos)
+        return pd.Series(texto, index=valores.index, name=valores.name).astype(str)
+    return _formatar_horas_array(valores, incluir_segundos)
+
+# Hover/texto dos gráficos a partir de customdata (sinal, h, m, s): o Plotly formata no
+# navegador, sem uma string Python por ponto no JSON da figura. O sinal vai à parte para
+# valores entre -1h e 0 não o perderem e a hora negativa sair "-01", como em `horas_para_tempo`
+MODELO_TEMPO = "%{customdata[0]}%{customdata[1]:02d}:%{customdata[2]:02d}:%{customdata[3]:02d}"
+
+def componentes_tempo(valores):
+    """
+    Matriz (..., 4) com sinal ("-" ou ""), horas, minutos e segundos de cada valor, para
+    `customdata` com `MODELO_TEMPO`. NaN vira 00:00:00 como em `horas_para_tempo`.
+    """
+    forma = np.shape(valores)
+    h, m, s, negativos, _ = _partes_horas(np.ravel(valores))
+    sinal = np.where(negativos, "-", "").astype(object)
+    partes = np.empty((len(h), 4), dtype=object)
+    partes[:, 0] = sinal
+    partes[:, 1:] = np.stack([h, m, s], axis=-1).astype(np.int32)
+    return partes.reshape(forma + (4,))
+
+# Colunas de horário lidas do arquivo -> colunas em horas decimais
+COLUNAS_HORARIO = {"Horas_Input": "Hora_Decimal", "Intervalos_Input": "Intervalo_Decimal"}
+
+_VAZIO, _TEMPO, _DURACAO, _DATA_HORA, _NUMERO, _TEXTO = range(6)
+
+def _tipo_celula(valor):
+    if isinstance(valor, dt.time):
+        return _TEMPO
+    if isinstance(valor, (dt.timedelta, np.timedelta64)):
+        return _DURACAO
+    if isinstance(valor, (dt.datetime, np.datetime64)):
+        return _DATA_HORA
+    if isinstance(valor, (int, float, np.integer, np.floating)) and not isinstance(valor, bool):
+        return _NUMERO
+    return _TEXTO
+
+def nova_contagem_horas():
+    """Contador de células por caminho de conversão (ver `converter_horas`)"""
+    return {"tempo": 0, "duracao": 0, "data_hora": 0, "serial": 0, "texto": 0, "vazio": 0}
+
+def converter_horas(valores):
+    """
+    Converte uma coluna de horários para horas decimais conforme o TIPO NATIVO da célula:
+    - datetime.time / Timedelta / datetime -> aritmética direta (sem passar por texto)
+    - número -> serial do Excel (fração do dia) x 24
+    - texto -> pd.to_timedelta, apenas para as células realmente textuais
+    Retorna (Series float64 em horas, contagem de células por caminho).
+    """
+    contagem = nova_contagem_horas()
+    n_vazios = int(valores.isna().sum())
+    contagem["vazio"] = n_vazios
+    n_validos = len(valores) - n_vazios
+
+    # Colunas com dtype homogêneo: uma única operação vetorizada
+    if pd.api.types.is_timedelta64_dtype(valores.dtype):
+        contagem["duracao"] = n_validos
+        return valores.dt.total_seconds() / 3600, contagem
+    if pd.api.types.is_datetime64_any_dtype(valores.dtype):
+        contagem["data_hora"] = n_validos
+        return (valores - valores.dt.normalize()).dt.total_seconds() / 3600, contagem
+    if pd.api.types.is_numeric_dtype(valores.dtype) and not pd.api.types.is_bool_dtype(valores.dtype):
+        contagem["serial"] = n_validos
+        return valores.astype(np.float64) * 24, contagem
+    if valores.dtype != object:
+        contagem["texto"] = n_validos
+        return pd.to_timedelta(valores, errors="coerce").dt.total_seconds() / 3600, contagem
+
+    # Coluna mista (object): separa por tipo e converte cada grupo de uma vez
+    brutos = valores.to_numpy(dtype=object)
+    horas = np.full(len(brutos), np.nan)
+    tipo = np.fromiter(map(_tipo_celula, brutos), dtype=np.int8, count=len(brutos))
+    tipo[valores.isna().to_numpy()] = _VAZIO
+    e_tempo, e_duracao, e_data_hora = tipo == _TEMPO, tipo == _DURACAO, tipo == _DATA_HORA
+    e_numero, e_texto = tipo == _NUMERO, tipo == _TEXTO
+
+    if e_tempo.any():
+        micros = pa.array(brutos[e_tempo], type=pa.time64("us")).cast(pa.int64()).to_numpy()
+        horas[e_tempo] = micros / 3.6e9
+    if e_duracao.any():
+        horas[e_duracao] = pd.to_timedelta(brutos[e_duracao]).total_seconds() / 3600
+    if e_data_hora.any():
+        datas = pd.DatetimeIndex(pd.to_datetime(brutos[e_data_hora]))
+        horas[e_data_hora] = (datas - datas.normalize()).total_seconds() / 3600
+    if e_numero.any():
+        horas[e_numero] = brutos[e_numero].astype(np.float64) * 24
+    if e_texto.any():
+        textos = pd.Series(brutos[e_texto]).astype(str)
+        horas[e_texto] = pd.to_timedelta(textos, errors="coerce").dt.total_seconds().to_numpy() / 3600
+
+    contagem.update(
+        tempo=int(e_tempo.sum()), duracao=int(e_duracao.sum()), data_hora=int(e_data_hora.sum()),
+        serial=int(e_numero.sum()), texto=int(e_texto.sum()),
+    )
+    return pd.Series(horas, index=valores.index), contagem
+
+def faixa_horas(horas):
+    """Código da faixa de cada valor (índice em ROTULOS_FAIXAS; -1 fora das faixas ou NaN)"""
+    codigos = pd.cut(horas, bins=LIMITES_FAIXAS, labels=False)
+    return pd.Series(codigos, index=getattr(horas, "index", None)).fillna(-1).astype(np.int8)
+
+def soma_maiores_intervalos(df_ordenado, chaves, n_intervalos=N_INTERVALOS):
+    """
+    Soma dos N maiores intervalos por grupo, sem callback Python por grupo.
+    Espera o DataFrame já ordenado por `chaves` + `Intervalo_Decimal` decrescente:
+    o cumcount marca a posição de cada linha no grupo e a máscara mantém só as N primeiras.
+    Retorna uma Series alinhada ao DataFrame (NaN fora do top-N) para somar no agg.
+    """
+    posicao = df_ordenado.groupby(chaves, sort=False, observed=True).cumcount()
+    return df_ordenado["Intervalo_Decimal"].where(posicao < n_intervalos)
+
+@medido("preparar_dados")
+def preparar_dados(df, n_intervalos=N_INTERVALOS):
     """
     Processamento centralizado de ALTA PERFORMANCE:
     - Uso de operações vetorizadas do NumPy/Pandas
     - Evita loops .apply() em colunas de cálculo
+    - `n_intervalos`: quantos dos maiores intervalos do dia são descontados
     """
     # 1. Conversão Temporal (Vetorizada)
     df["Data"] = pd.to_datetime(df["Data"], errors="coerce")
     
-    # Converter Horas_Input e Intervalos_Input para decimais sem usar strings se possível
-    # Se já forem datetime.time ou strings, to_timedelta funciona bem
-    df["Hora_Decimal"] = pd.to_timedelta(df["Horas_Input"].astype(str), errors="coerce").dt.total_seconds() / 3600
-    df["Intervalo_Decimal"] = pd.to_timedelta(df["Intervalos_Input"].astype(str), errors="coerce").dt.total_seconds() / 3600
+    # Horários normalmente já chegam em horas decimais do carregador (`converter_horas`);
+    # frames vindos de outras fontes ainda com as colunas brutas são convertidos aqui
+    for bruta, decimal in COLUNAS_HORARIO.items():
+        if decimal not in df.columns and bruta in df.columns:
+            df[decimal], _ = converter_horas(df[bruta])
     
     # 2. Agrupamentos (Otimizado via Pandas Nativo)
     # Agrupamos uma única vez para pegar os extremos e os metadados
     df_agrupado = df.sort_values(["Colaborador", "Data", "Intervalo_Decimal"], ascending=[True, True, False])
+    df_agrupado["Intervalo_TopN"] = soma_maiores_intervalos(df_agrupado, ["Colaborador", "Data"], n_intervalos)
     
     # Pegar Início, Fim e Metadados (Rota, Regional, MRU) em um único passo
-    resultado = df_agrupado.groupby(["Colaborador", "Data"], sort=False).agg({
+    resultado = df_agrupado.groupby(["Colaborador", "Data"], sort=False, observed=True).agg({
         "Hora_Decimal": ["min", "max"],
-        "Intervalo_Decimal": lambda x: x.head(3).sum(), # Soma dos 3 maiores intervalos
+        "Intervalo_TopN": "sum", # Soma dos N maiores intervalos (máscara vetorizada)
         "Rota": "first",
         "Regional": "first",
         "MRU": "first"
@@ -59,22 +265,111 @@ def preparar_dados(df):
     
     # 3. Cálculos Finais (Vetorizados)
     resultado["Horas_Dias_dec"] = resultado["Hora_Final_dec"] - resultado["Hora_inicio_dec"]
-    resultado["Horas_Trabalhadas_dec"] = resultado["Horas_Dias_dec"] - resultado["Soma_Intervalos"]
-    
-    # 4. Formatação Dinâmica (Apenas para o que será exibido)
-    # Dica: Em datasets gigantes, converter para string é o que mais demora.
-    # Fazemos isso no final apenas para as colunas de visualização.
-    resultado["Data_Formatada"] = resultado["Data"].dt.strftime("%d/%m/%Y")
+    resultado["Horas_Liquidas"] = resultado["Horas_Dias_dec"] - resultado["Soma_Intervalos"]
     
-    # Usar .apply apenas nas colunas finais (agora muito menores que o DF original)
-    resultado["Hora_inicio"] = resultado["Hora_inicio_dec"].apply(horas_para_tempo)
-    resultado["Hora_Final"] = resultado["Hora_Final_dec"].apply(horas_para_tempo)
-    resultado["Horas_Dias"] = resultado["Horas_Dias_dec"].apply(horas_para_tempo)
-    resultado["Intervalo"] = resultado["Soma_Intervalos"].apply(horas_para_tempo)
-    resultado["Horas_Trabalhadas"] = resultado["Horas_Trabalhadas_dec"].apply(horas_para_tempo)
-    
-    # Compatibilidade com o Dashboard
-    resultado["Horas_Liquidas"] = resultado["Horas_Trabalhadas_dec"]
-    resultado["MRU_Completa"] = resultado["MRU"].astype(str)
-    
-    return resultado
+    # 4. Sem colunas de texto: HH:MM:SS e dd/mm/aaaa são gerados em `formatar_exibicao`
+    # apenas para as linhas exibidas/exportadas.
+    return compactar(resultado)
+
+def compactar(df):
+    """
+    Tipos do dataset processado: horas (COLUNAS_TEMPO) em TIPO_HORAS e dimensões como
+    Categorical sem categorias vazias (ex.: de linhas com Data inválida). Altera `df`.
+    """
+    for coluna in COLUNAS_TEMPO:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype(TIPO_HORAS)
+    for coluna in ["Colaborador", "Rota", "Regional", "MRU"]:
+        if coluna not in df.columns:
+            continue
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].cat.remove_unused_categories()
+        else:
+            df[coluna] = df[coluna].astype("category")
+    return df
+
+def horas_float64(valores):
+    """
+    Alarga horas compactas para float64 arredondando ao segundo (remove o ruído do float32,
+    ex.: 8.000277519 -> 8.000277778); colunas já em float64 voltam inalteradas.
+    """
+    if valores.dtype != np.float32:
+        return valores
+    return (valores.astype(np.float64) * 3600).round() / 3600
+
+def _para_arrow(df):
+    """DataFrame -> buffer Arrow IPC (colunar; transferido ao processo sem pickle por objeto)"""
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return destino.getvalue()
+
+def _de_arrow(buffer):
+    return pa.ipc.open_stream(buffer).read_all().to_pandas()
+
+def _preparar_fatia(buffer, n_intervalos):
+    """Executado no processo do pool: uma fatia de Colaboradores, ida e volta em Arrow"""
+    return _para_arrow(preparar_dados(_de_arrow(buffer), n_intervalos))
+
+def preparar_dados_paralelo(df, n_intervalos=N_INTERVALOS, processos=None, min_linhas=PARALELO_MIN_LINHAS):
+    """
+    `preparar_dados` em vários núcleos. Toda a agregação é por (Colaborador, Data), então
+    o frame bruto é particionado por hash do Colaborador (código do Categorical) e cada
+    fatia é processada em um processo do pool; as fatias vão e voltam como Arrow IPC.
+    Abaixo de `min_linhas` (ou com 1 processo) segue o caminho serial.
+    A saída é idêntica à de `preparar_dados` (mesma ordem, dtypes e categorias).
+    """
+    processos = processos or PARALELO_PROCESSOS
+    if processos <= 1 or len(df) < min_linhas:
+        return preparar_dados(df, n_intervalos)
+
+    with etapa("preparar_dados_paralelo", processos=processos, linhas_entrada=len(df)) as medida:
+        # 1. Partição por Colaborador (linhas sem Colaborador são descartadas no groupby de qualquer forma)
+        if isinstance(df["Colaborador"].dtype, pd.CategoricalDtype):
+            codigos = df["Colaborador"].cat.codes.to_numpy()
+        else:
+            codigos = pd.util.hash_array(df["Colaborador"].astype(str).to_numpy())
+        fatia = codigos % processos
+        buffers = [_para_arrow(df[fatia == i]) for i in range(processos)]
+
+        # 2. Processamento das fatias ("spawn": seguro dentro do servidor multithread do Streamlit)
+        with ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn")) as pool:
+            partes = [_de_arrow(b) for b in pool.map(_preparar_fatia, buffers, [n_intervalos] * processos)]
+
+        # 3. Junta as fatias com as mesmas categorias/ordem do caminho serial
+        resultado = pd.concat(partes, ignore_index=True)
+        # (fatias com categorias diferentes voltam do concat como texto)
+        for coluna in ["Colaborador", "Rota", "Regional", "MRU"]:
+            if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+                resultado[coluna] = pd.Categorical(
+                    resultado[coluna].astype(object), dtype=df[coluna].dtype
+                ).remove_unused_categories()
+            else:
+                # Entrada em texto: categorias inferidas dos valores, como o `compactar` serial
+                resultado[coluna] = resultado[coluna].astype(object).astype("category")
+        medida["linhas"] = len(resultado)
+        return resultado.sort_values(["Colaborador", "Data"], ignore_index=True, kind="stable")
+
+# Colunas decimais -> rótulo exibido na tabela/exportações
+COLUNAS_TEMPO = {
+    "Hora_inicio_dec": "Hora Início",
+    "Hora_Final_dec": "Hora Final",
+    "Horas_Dias_dec": "Total Bruto",
+    "Soma_Intervalos": "Intervalo",
+    "Horas_Liquidas": "Horas Líquidas",
+}
+
+def formatar_exibicao(df, formatar_data=True):
+    """
+    Gera o DataFrame de exibição/exportação (Data, dimensões e tempos em HH:MM:SS)
+    somente para as linhas recebidas. Com `formatar_data=False` a Data segue como
+    datetime (usado no Excel, que aplica o próprio formato de data).
+    """
+    exibicao = pd.DataFrame(index=df.index)
+    exibicao["Data"] = df["Data"].dt.strftime("%d/%m/%Y") if formatar_data else df["Data"]
+    for coluna in ["Colaborador", "Rota", "Regional", "MRU"]:
+        exibicao[coluna] = df[coluna]
+    for coluna, rotulo in COLUNAS_TEMPO.items():
+        exibicao[rotulo] = horas_para_tempo_vetorizado(df[coluna])
+    return exibicao
@@ -0,0 +1,168 @@
+import os
+import threading
+import weakref
+import logging
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+
+from leitura_excel import limpar_cache, _sufixo_temporario
+
+logger = logging.getLogger(__name__)
+
+# ==================== REGISTRO COMPARTILHADO DE DATASETS ====================
+# Um único objeto por processo: sessões que abrem o mesmo recorte (mesma chave de conteúdo)
+# compartilham a mesma cópia imutável em memória. Entre processos, o recorte montado é
+# gravado como arquivo Arrow IPC e reaberto via memory map por quem chegar depois.
+REGISTRO_DIR = os.environ.get("REGISTRO_DIR", ".registro_arrow")
+REGISTRO_MAX_MB = int(os.environ.get("REGISTRO_MAX_MB", 2048))
+REGISTRO_DISCO_MAX_MB = int(os.environ.get("REGISTRO_DISCO_MAX_MB", 4096))
+
+
+def caminho_arrow(chave, diretorio=REGISTRO_DIR):
+    return os.path.join(diretorio, f"{chave}.arrow")
+
+
+def _tabela_mapeavel(df):
+    """
+    Tabela Arrow do DataFrame com as colunas float gravadas com NaN como valor (sem bitmap
+    de nulos): sem nulos, a conversão de volta para pandas pode apontar para o buffer mapeado
+    em vez de copiar a coluna para preencher NaN. O pandas lê NaN como ausente do mesmo jeito.
+    """
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    for i, nome in enumerate(tabela.column_names):
+        if pd.api.types.is_float_dtype(df[nome].dtype):
+            tabela = tabela.set_column(i, tabela.schema.field(nome), pa.array(df[nome].to_numpy(), from_pandas=False))
+    return tabela
+
+
+def salvar_arrow(df, caminho, diretorio=REGISTRO_DIR):
+    """Grava o DataFrame como Arrow IPC sem compressão (mapeável) de forma atômica"""
+    os.makedirs(diretorio, exist_ok=True)
+    temp_path = f"{caminho}.{_sufixo_temporario()}.tmp"
+    try:
+        tabela = _tabela_mapeavel(df)
+        with pa.OSFile(temp_path, "wb") as destino, pa.ipc.new_file(destino, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+        os.replace(temp_path, caminho)
+    except Exception as e:
+        # Sem o arquivo Arrow o recorte só deixa de ser reaproveitado por outros processos
+        logger.warning("Falha ao gravar o recorte %s (%s: %s)", caminho, type(e).__name__, e)
+        try: os.remove(temp_path)
+        except OSError: pass
+        return
+    limpar_cache(diretorio, max_mb=REGISTRO_DISCO_MAX_MB)
+
+
+def abrir_arrow(caminho):
+    """
+    Reabre um recorte gravado por `salvar_arrow` via memory map. Os buffers Arrow vêm
+    do cache de páginas do SO (compartilhado entre processos). Só as colunas sem nulos
+    viram pandas sem cópia: Data e as horas (gravadas com NaN como valor, ver
+    `_tabela_mapeavel`). Os códigos das Categorical são copiados (1-2 bytes por linha),
+    então cada processo ainda guarda essa parte em memória própria.
+    """
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with pa.memory_map(caminho) as fonte:
+            tabela = pa.ipc.open_file(fonte).read_all()
+        try: os.utime(caminho, None)
+        except OSError: pass
+        return tabela.to_pandas(split_blocks=True)
+    except:
+        return None  # Arquivo truncado/corrompido: quem chamou reconstrói
+
+
+def tamanho_memoria(valor):
+    """Bytes ocupados por um valor do registro (DataFrame ou objeto com `.df` / `.cubo`)"""
+    total = 0
+    for df in (getattr(valor, "df", valor), getattr(valor, "cubo", None)):
+        if df is not None and hasattr(df, "memory_usage"):
+            total += int(df.memory_usage(deep=True).sum())
+    return total
+
+
+class Referencia:
+    """
+    Posse de uma entrada do registro por uma sessão. É liberada explicitamente
+    (`liberar`) ou quando o objeto é coletado (por exemplo, ao fim da sessão).
+    """
+
+    def __init__(self, registro, chave):
+        self.chave = chave
+        self._finalizador = weakref.finalize(self, registro.liberar, chave)
+
+    def liberar(self):
+        self._finalizador()
+
+
+class RegistroDatasets:
+    """
+    Registro de datasets por chave de conteúdo, com contagem de referências e
+    despejo LRU sob um orçamento de memória:
+    - `adquirir` devolve o valor (constrói uma única vez, mesmo com sessões simultâneas)
+      e uma `Referencia`; entradas com referências ativas nunca são despejadas
+    - acima de `max_mb`, as entradas sem referências menos usadas saem primeiro
+    """
+
+    def __init__(self, max_mb=REGISTRO_MAX_MB):
+        self.max_bytes = max_mb * 1024 * 1024
+        self._entradas = OrderedDict()  # chave -> {"valor", "bytes", "refs"}
+        self._lock = threading.Lock()
+        self._construindo = {}
+
+    def adquirir(self, chave, construir):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                lock_chave = self._construindo.setdefault(chave, threading.Lock())
+        if entrada is None:
+            # Construção fora do lock global: só quem pede a mesma chave espera
+            with lock_chave:
+                with self._lock:
+                    entrada = self._entradas.get(chave)
+                if entrada is None:
+                    valor = construir()
+                    entrada = {"valor": valor, "bytes": tamanho_memoria(valor), "refs": 0}
+                    with self._lock:
+                        self._entradas[chave] = entrada
+                        self._construindo.pop(chave, None)
+        with self._lock:
+            entrada["refs"] += 1
+            self._entradas.move_to_end(chave)
+            self._despejar()
+        return entrada["valor"], Referencia(self, chave)
+
+    def liberar(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                entrada["refs"] = max(0, entrada["refs"] - 1)
+                self._despejar()
+
+    def _despejar(self):
+        total = sum(e["bytes"] for e in self._entradas.values())
+        for chave in list(self._entradas):
+            if total <= self.max_bytes:
+                break
+            entrada = self._entradas[chave]
+            if entrada["refs"] == 0:
+                total -= entrada["bytes"]
+                del self._entradas[chave]
+                logger.info("Registro: despejado %s (%d bytes)", chave, entrada["bytes"])
+
+    def estatisticas(self):
+        """Resumo para diagnóstico: entradas, memória total e referências por entrada"""
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "bytes": sum(e["bytes"] for e in self._entradas.values()),
+                "max_bytes": self.max_bytes,
+                "refs": {chave: e["refs"] for chave, e in self._entradas.items()},
+            }
+
+
+# Instância única por processo (importada por todas as sessões do Streamlit)
+registro = RegistroDatasets()
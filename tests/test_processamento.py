@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from processamento import preparar_dados, preparar_dados_paralelo
+
+
+def bruto(n_linhas, categorical, n_colaboradores=200, seed=7):
+    """Frame bruto no formato de `carregar_dados`, com dimensões Categorical ou em texto"""
+    rng = np.random.default_rng(seed)
+    colab = rng.integers(0, n_colaboradores, n_linhas)
+    rota = colab % 30
+    df = pd.DataFrame({
+        "Data": pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 20, n_linhas), unit="D"),
+        "Rota": pd.Categorical.from_codes(rota, [f"R{i:03d}" for i in range(30)]),
+        "Regional": pd.Categorical.from_codes(rota % 5, ["Centro", "Leste", "Norte", "Oeste", "Sul"]),
+        "MRU": pd.Categorical.from_codes(rng.integers(0, 500, n_linhas), [f"{i:08d}" for i in range(500)]),
+        "Hora_Decimal": rng.uniform(6, 20, n_linhas),
+        "Colaborador": pd.Categorical.from_codes(colab, [f"Colab {i:05d}" for i in range(n_colaboradores)]),
+        "Intervalo_Decimal": rng.random(n_linhas) * 2,
+    })
+    df.loc[rng.random(n_linhas) < 0.01, "Hora_Decimal"] = np.nan
+    df.loc[rng.random(n_linhas) < 0.01, "Colaborador"] = np.nan
+    if not categorical:
+        for coluna in ["Rota", "Regional", "MRU", "Colaborador"]:
+            df[coluna] = df[coluna].astype(object)
+    return df
+
+
+@pytest.mark.parametrize("categorical", [True, False], ids=["categorical", "texto"])
+@pytest.mark.parametrize("processos", [2, 3])
+def test_paralelo_identico_ao_serial(categorical, processos):
+    df = bruto(20_000, categorical)
+    serial = preparar_dados(df.copy())
+    paralelo = preparar_dados_paralelo(df.copy(), processos=processos, min_linhas=0)
+    pd.testing.assert_frame_equal(paralelo, serial)